@@ -0,0 +1,255 @@
+import pandas as pd
+import numpy as np
+import warnings
+from os import cpu_count
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.base import clone
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+from skforecast.ForecasterSarimax import ForecasterSarimax
+from skforecast.model_selection import backtesting_forecaster
+from skforecast.model_selection_sarimax import backtesting_sarimax
+from skforecast.utils import load_forecaster
+from helper_functions import metrics
+
+# Backtesting arguments used for every job in '02 Test Models'
+# ======================================================
+BACKTEST_KWARGS = dict(
+    fixed_train_size=True,
+    metric='mean_absolute_error',
+    refit=True,
+    verbose=False,
+    show_progress=False,
+    n_jobs=1,
+)
+
+# Frame shared with the current worker process, set by init_worker
+SHARED = {}
+
+
+def share_frame(df: pd.DataFrame):
+    """
+    Copies a frame's values into shared memory, one block per dtype, so that
+    compact dtypes (bool dummies, int8 counts, float32 values from
+    compact_frame) keep their size in every worker. Columns with pandas
+    extension dtypes (e.g. Int64) are stored as float64.
+
+    Parameters:
+        df (pd.DataFrame): The feature matrix, including the target column.
+
+    Returns:
+        tuple: The list of SharedMemory blocks (which the caller must close and
+        unlink) and the spec workers need to attach to them.
+    """
+    dtypes = [d if isinstance(d, np.dtype) else np.dtype(np.float64) for d in df.dtypes]
+    shms, blocks = [], []
+    for dtype in dict.fromkeys(dtypes):
+        columns = [col for col, d in zip(df.columns, dtypes) if d == dtype]
+        values = df[columns].to_numpy(dtype=dtype)
+        shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=dtype, buffer=shm.buf)[:] = values
+        shms.append(shm)
+        blocks.append(dict(name=shm.name, dtype=dtype.str, shape=values.shape, columns=columns))
+    return shms, dict(blocks=blocks, index=df.index)
+
+
+def init_worker(spec: dict):
+    """
+    Attaches a worker process to the shared feature matrix without copying it.
+    Columns are grouped by dtype, in the order of spec's blocks.
+    """
+    SHARED['shm'] = [shared_memory.SharedMemory(name=block['name']) for block in spec['blocks']]
+    frames = [pd.DataFrame(np.ndarray(block['shape'], dtype=np.dtype(block['dtype']), buffer=shm.buf),
+                           index=spec['index'], columns=block['columns'], copy=False)
+              for shm, block in zip(SHARED['shm'], spec['blocks'])]
+    SHARED['df'] = pd.concat(frames, axis=1, copy=False)
+
+
+def job_name(forecaster) -> str:
+    """
+    Names a job by its forecaster file, or else by the regressor's class name.
+    """
+    if isinstance(forecaster, str):
+        return forecaster
+    regressor = getattr(forecaster, 'regressor', None)
+    return type(forecaster if regressor is None else regressor).__name__
+
+
+def run_job(job: tuple):
+    """
+    Backtests one forecaster at one horizon on the shared feature matrix.
+
+    Parameters:
+        job (tuple): (name, forecaster, horizon, target, kwargs), as built by run_backtests.
+
+    Returns:
+        tuple: The job name, horizon, and the backtest predictions.
+    """
+    name, forecaster, horizon, target, kwargs = job
+    if isinstance(forecaster, str):
+        forecaster = load_forecaster(forecaster, verbose=False)
+    df = SHARED['df']
+    exog_cols = getattr(forecaster, 'exog_col_names', None)
+    if isinstance(forecaster, ForecasterSarimax):
+        backtest = backtesting_sarimax
+        kwargs = {'suppress_warnings_fit': True, **kwargs}
+    else:
+        backtest = backtesting_forecaster
+    _, preds = backtest(
+        forecaster=forecaster,
+        y=df[target],
+        exog=df[exog_cols] if exog_cols else None,
+        steps=horizon,
+        **kwargs
+    )
+    return name, horizon, preds
+
+
+def run_backtests(
+                jobs: list,
+                df: pd.DataFrame,
+                initial_train_size: int,
+                target: str = 'cases',
+                max_workers: int = None,
+                **backtest_kwargs
+                ):
+    """
+    Runs backtests for many (forecaster, horizon) jobs across a process pool.
+
+    The feature matrix is placed in shared memory once and every worker reads
+    it from there, so it is not pickled per job. Each forecaster uses the exog
+    columns it was fitted with.
+
+    Parameters:
+        jobs (list): Tuples (forecaster, horizon) or (forecaster, horizon, kwargs), or
+            dicts with keys 'forecaster', 'horizon' and optionally 'kwargs' and 'name'.
+            A forecaster is either a fitted forecaster or a file for load_forecaster;
+            kwargs override the backtesting arguments for that job alone. The name
+            labels the job in the results and defaults to job_name(forecaster);
+            give one when several jobs share a regressor class.
+        df (pd.DataFrame): The feature matrix, including the target column.
+        initial_train_size (int): Number of observations used for the initial fit.
+        target (str): The target column. Default is 'cases'.
+        max_workers (int): Number of worker processes. Default is None (one per job, up to the CPU count).
+        **backtest_kwargs: Overrides for BACKTEST_KWARGS applied to every job.
+
+    Returns:
+        tuple: A metrics table with one row per job (model, horizon, mae, rmse)
+        and a long frame of predictions with 'model' and 'horizon' columns.
+    """
+    tasks = []
+    for job in jobs:
+        if not isinstance(job, dict):
+            job = dict(zip(('forecaster', 'horizon', 'kwargs'), job))
+        forecaster, horizon = job['forecaster'], job['horizon']
+        kwargs = {**BACKTEST_KWARGS, 'initial_train_size': initial_train_size, **backtest_kwargs,
+                  **job.get('kwargs', {})}
+        tasks.append((job.get('name') or job_name(forecaster), forecaster, horizon, target, kwargs))
+
+    seen = [(name, horizon) for name, _, horizon, _, _ in tasks]
+    duplicates = sorted({key for key in seen if seen.count(key) > 1}, key=str)
+    if duplicates:
+        raise ValueError(f'Several jobs are named {duplicates}; give each job a distinct name.')
+
+    shms, spec = share_frame(df)
+    try:
+        with ProcessPoolExecutor(max_workers or min(len(tasks), cpu_count()),
+                                 initializer=init_worker, initargs=(spec,)) as pool:
+            results = list(pool.map(run_job, tasks))
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    rows, predictions = [], []
+    for name, horizon, preds in results:
+        mae, rmse = metrics(preds['pred'], df[target].loc[preds.index])
+        rows.append({'model': name, 'horizon': horizon, 'mae': mae, 'rmse': rmse})
+        predictions.append(preds.assign(model=name, horizon=horizon))
+
+    return pd.DataFrame(rows), pd.concat(predictions)
+
+
+def backtesting_sarimax_incremental(
+                                forecaster: ForecasterSarimax,
+                                y: pd.Series,
+                                initial_train_size: int,
+                                steps: int,
+                                exog: pd.DataFrame = None,
+                                reestimate_every: int = 4,
+                                fixed_train_size: bool = True,
+                                tolerance: float = None
+                                ):
+    """
+    Rolling SARIMAX backtest that re-estimates parameters only every few folds.
+
+    On a re-estimation fold the model is fitted on the training window, as
+    backtesting_sarimax does with refit=True, but the optimizer starts from the
+    previous fold's parameters. On the folds in between, the parameters and the
+    fitted transformers are kept and the Kalman filter is only extended with
+    the new observations, so no optimizer runs at all.
+
+    Parameters:
+        forecaster (ForecasterSarimax): Forecaster whose Sarimax settings and transformers are used.
+        y (pd.Series): Target series.
+        initial_train_size (int): Number of observations in the first training window.
+        steps (int): Forecast horizon of each fold.
+        exog (pd.DataFrame): Exogenous variables aligned with y. Default is None.
+        reestimate_every (int): Re-estimate parameters every this many folds; 1 refits every fold. Default is 4.
+        fixed_train_size (bool): Whether the training window slides rather than grows. Default is True.
+        tolerance (float): If given, also run the full-refit backtesting_sarimax and raise
+            ValueError if any prediction differs from it by more than this relative tolerance.
+            Default is None (no check).
+
+    Returns:
+        tuple: The mean absolute error and a DataFrame of predictions in column 'pred'.
+    """
+    if not isinstance(reestimate_every, (int, np.integer)) or reestimate_every < 1:
+        raise ValueError(f'`reestimate_every` must be a positive integer, got {reestimate_every!r}.')
+    regressor = forecaster.regressor
+    init_kwargs = {k: v for k, v in regressor._init_kwargs.items() if k not in ('dates', 'freq')}
+    fit_kwargs = dict(regressor._fit_kwargs)
+
+    def transform(transformer, values, fit=False):
+        if transformer is None:
+            return np.asarray(values, dtype=float)
+        values = np.asarray(values, dtype=float).reshape(len(values), -1)
+        return transformer.fit_transform(values) if fit else transformer.transform(values)
+
+    params, preds = None, []
+    for fold, start in enumerate(range(initial_train_size, len(y), steps)):
+        stop = min(start + steps, len(y))
+        if fold % reestimate_every == 0:
+            window = slice(start - initial_train_size if fixed_train_size else 0, start)
+            transformer_y = None if forecaster.transformer_y is None else clone(forecaster.transformer_y)
+            transformer_exog = None if forecaster.transformer_exog is None else clone(forecaster.transformer_exog)
+            endog = transform(transformer_y, y.iloc[window], fit=True).ravel()
+            window_exog = None if exog is None else transform(transformer_exog, exog.iloc[window], fit=True)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                res = SARIMAX(endog, exog=window_exog, **init_kwargs)\
+                        .fit(**{**fit_kwargs, 'start_params': params})
+            params = res.params
+
+        fold_exog = None if exog is None else transform(transformer_exog, exog.iloc[start:stop])
+        forecast = np.asarray(res.forecast(stop - start, exog=fold_exog)).reshape(-1, 1)
+        if transformer_y is not None:
+            forecast = transformer_y.inverse_transform(forecast)
+        preds.append(pd.DataFrame({'pred': forecast.ravel()}, index=y.index[start:stop]))
+
+        res = res.extend(transform(transformer_y, y.iloc[start:stop]).ravel(), exog=fold_exog)
+
+    preds = pd.concat(preds)
+    mae = float(np.mean(np.abs(preds['pred'] - y.loc[preds.index])))
+
+    if tolerance is not None:
+        _, full = backtesting_sarimax(forecaster=forecaster, y=y, exog=exog, steps=steps,
+                                      initial_train_size=initial_train_size,
+                                      **{**BACKTEST_KWARGS, 'fixed_train_size': fixed_train_size,
+                                         'suppress_warnings_fit': True})
+        deviation = np.max(np.abs(preds['pred'] - full['pred']) / np.abs(full['pred']).clip(lower=1e-12))
+        if deviation > tolerance:
+            raise ValueError(f'Incremental predictions deviate from full refit by {deviation:.2%}, '
+                             f'more than the tolerance of {tolerance:.2%}.')
+
+    return mae, preds
@@ -0,0 +1,592 @@
+import pandas as pd
+import numpy as np
+import argparse, json, math, os, platform, subprocess, sys, tempfile, time, warnings
+from datetime import datetime
+from os import path, makedirs
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+ANALYSIS_PATH = path.dirname(path.abspath(__file__))
+DATASETS_PATH = path.join(ANALYSIS_PATH, '..', 'datasets')
+
+DEFAULT_SCALES = [10**3, 10**4, 10**5, 10**6]
+CHUNK_ROWS = 10**6
+
+LAGGED_VARIABLES = ['GS_cold', 'GS_cough', 'GS_fever', 'GS_flu',
+                    'AWND', 'PRCP','SNOW', 'TAVG','TMAX', 'TMIN',
+                    'Overall AQI Value',
+                    'CO', 'Ozone', 'PM10', 'PM25', 'Days Moderate',
+                    'Days Unhealthy', 'visits','Main Pollutant_CO',
+                    'Main Pollutant_NO2', 'Main Pollutant_PM2.5']
+
+DAILY_START, DAILY_END = np.datetime64('2005-01-01'), np.datetime64('2019-12-31')
+TRENDS_TERMS = ['flu', 'fever', 'cough', 'cold']
+NCEI_DATATYPES = ['TMIN', 'TMAX', 'TAVG', 'PRCP', 'AWND', 'SNOW']
+POLLUTANTS = ['Ozone', 'PM2.5', 'PM10', 'CO', 'NO2']
+MDSS_PERIODS = [(2000, 2004), (2005, 2009), (2010, 2014), (2015, 2019), (2019, 2023)]
+MAX_WEEKS = 2 * 10**4   # weeks from 1700 that fit in datetime64[ns]
+
+# Seconds a fresh interpreter may spend importing each module on top of
+# pandas and numpy, which every module needs. Backtesting and serving pay for
+# skforecast (and with it sklearn, optuna and pmdarima); everything else
+# defers plotting, statistics and API clients to first use.
+IMPORT_BUDGET = {
+    'helper_functions': 0.25,
+    'scoring': 0.25,
+    'utils.build_raw_dataset': 0.5,
+    'probabilistic_forecasting': 1.5,
+    'backtesting_runner': 3.0,
+    'forecast_service': 3.0,
+}
+
+
+# Synthetic data generators
+# ======================================================
+# Each generator matches the schema its loader reads. File-based generators
+# write in chunks of CHUNK_ROWS rows so that 10**8-row inputs never have to
+# fit in memory, and skip files that already exist in the work directory.
+
+def daily_dates(rows: int, rng: np.random.Generator, start=DAILY_START, end=DAILY_END) -> np.ndarray:
+    """
+    Sorted random days between start and end, several per day once rows exceeds the span.
+    """
+    span = (end - start).astype(np.int64) + 1
+    return np.sort(start + rng.integers(0, span, rows).astype('timedelta64[D]'))
+
+
+def weekly_index(rows: int) -> pd.DatetimeIndex:
+    """
+    Sunday week starts from 1700-01-03, built in numpy because pd.date_range
+    overflows a Timedelta past about 290 years.
+    """
+    return pd.DatetimeIndex(np.datetime64('1700-01-03') + 7 * np.arange(rows).astype('timedelta64[D]'), freq='W')
+
+
+def synthetic_msss(rows: int, file: str, seed: int = 0) -> str:
+    """
+    Writes an MSSS visit log: one emergency department or urgent care visit per row.
+    """
+    if path.isfile(file):
+        return file
+    rng = np.random.default_rng(seed)
+    span = (DAILY_END - DAILY_START).astype('timedelta64[s]').astype(np.int64)
+    nchunks = math.ceil(rows / CHUNK_ROWS)
+    for i in range(nchunks):
+        n = min(CHUNK_ROWS, rows - i * CHUNK_ROWS)
+        lo, hi = span * i // nchunks, span * (i + 1) // nchunks    # chunks cover consecutive periods, as in a log
+        seconds = np.sort(rng.integers(lo, hi, n))
+        admitted = DAILY_START.astype('datetime64[s]') + seconds.astype('timedelta64[s]')
+        pd.DataFrame({
+            'Visit ID': np.arange(i * CHUNK_ROWS, i * CHUNK_ROWS + n),
+            'Admitted': np.datetime_as_string(admitted).astype(object),
+            'Facility': rng.choice([f'Facility {k}' for k in range(40)], n),
+            'County': rng.choice(['Kent', 'Ottawa', 'Allegan', 'Muskegon'], n, p=[.7, .1, .1, .1]),
+            'Age': rng.integers(0, 100, n),
+            'Sex': rng.choice(['F', 'M', 'U'], n),
+            'Chief Complaint': rng.choice(['FEVER', 'COUGH', 'FLU LIKE SYMPTOMS', 'SORE THROAT'], n),
+        }).to_csv(file, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    return file
+
+
+def synthetic_aqi_daily(rows: int, data_path: str, seed: int = 0) -> str:
+    """
+    Writes EPA daily AQI files aqidaily{year}.csv for 2005-2019, with rows spread
+    over the years and several monitoring sites per day. Missing readings are '.'.
+    """
+    makedirs(data_path, exist_ok=True)
+    years = range(2005, 2020)
+    if all(path.isfile(path.join(data_path, f'aqidaily{y}.csv')) for y in years):
+        return data_path
+    rng = np.random.default_rng(seed)
+    per_year = np.diff(np.linspace(0, rows, len(years) + 1).astype(np.int64))
+    for year, n_year in zip(years, per_year):
+        file = path.join(data_path, f'aqidaily{year}.csv')
+        start, end = np.datetime64(f'{year}-01-01'), np.datetime64(f'{year}-12-31')
+        for i, lo in enumerate(range(0, n_year, CHUNK_ROWS)):
+            n = min(CHUNK_ROWS, n_year - lo)
+            dates = daily_dates(n, rng, start, end)
+            frame = pd.DataFrame({
+                'Date': pd.DatetimeIndex(dates).strftime('%m/%d/%Y'),
+                'Overall AQI Value': rng.integers(5, 180, n),
+                'Main Pollutant': rng.choice(POLLUTANTS, n, p=[.5, .3, .1, .05, .05]),
+                'Site Name': rng.choice(['Grand Rapids-Monroe', 'Jenison', 'Evans'], n),
+                'Site ID': rng.choice(['26-081-0020', '26-139-0005', '26-081-0022'], n),
+                'Source': 'AQS',
+            })
+            for col, scale in [('CO', 10), ('Ozone', 60), ('SO2', 10), ('PM10', 30), ('PM25', 50), ('NO2', 30)]:
+                values = rng.integers(0, scale, n).astype(float)
+                values[rng.random(n) < .2] = np.nan
+                frame[col] = values
+            frame.to_csv(file, mode='w' if i == 0 else 'a', header=i == 0, index=False, na_rep='.')
+    return data_path
+
+
+def synthetic_ncei_daily(rows: int, file: str, seed: int = 0) -> str:
+    """
+    Writes GHCND daily observations in the long form get_ncei_dataset returns:
+    one (station, date, datatype) value per row, for as many stations as rows require.
+    """
+    if path.isfile(file):
+        return file
+    rng = np.random.default_rng(seed)
+    days = np.arange(DAILY_START, DAILY_END + 1)
+    per_station = len(days) * len(NCEI_DATATYPES)
+    nstations = math.ceil(rows / per_station)
+    written = 0
+    for s in range(nstations):
+        for i, lo in enumerate(range(0, per_station, CHUNK_ROWS)):
+            n = min(CHUNK_ROWS, per_station - lo, rows - written)
+            if n <= 0:
+                break
+            positions = np.arange(lo, lo + n)
+            pd.DataFrame({
+                'date': np.char.add(np.datetime_as_string(days[positions // len(NCEI_DATATYPES)]), 'T00:00:00'),
+                'datatype': np.asarray(NCEI_DATATYPES)[positions % len(NCEI_DATATYPES)],
+                'station': f'GHCND:USW000{94860 + s:05d}',
+                'attributes': ',,W,2400',
+                'value': rng.normal(40, 20, n).round(1),
+            }).to_csv(file, mode='w' if written == 0 else 'a', header=written == 0, index=False)
+            written += n
+    return file
+
+
+def synthetic_mdss_exports(rows: int, data_path: str, seed: int = 0) -> list:
+    """
+    Writes MDSS weekly case exports, one per period in MDSS_PERIODS: a preamble,
+    a title row, a Region/County/'WW-YYYY'.../Total header and one row per county.
+    Kent is the first county; rows counts (county, week) cells across all files.
+    """
+    from utils.epiweek_codes import fromdates, split
+    rng = np.random.default_rng(seed)
+    periods = [(np.unique(fromdates(np.arange(np.datetime64(f'{a}-01-01'), np.datetime64(f'{b}-12-31'), 7))), a, b)
+               for a, b in MDSS_PERIODS]
+    ncounties = math.ceil(rows / sum(len(codes) for codes, _, _ in periods))
+    counties = ['Kent'] + [f'County {i}' for i in range(1, ncounties)]
+    files = []
+    for codes, a, b in periods:
+        file = path.join(data_path, f'cases {a} to {b}.csv')
+        files.append(file)
+        if path.isfile(file):
+            continue
+        years, weeks = split(codes)
+        labels = [f'{w}-{y}' for y, w in zip(years, weeks)]
+        cases = rng.poisson(20, (ncounties, len(codes)))
+        df = pd.DataFrame(cases, columns=labels)
+        df.insert(0, 'County', counties)
+        df.insert(0, 'Region', [f'Region {i % 8 + 1}' for i in range(ncounties)])
+        df['Total'] = cases.sum(axis=1)
+        makedirs(data_path, exist_ok=True)
+        with open(file, 'w') as f:
+            f.write('Michigan Disease Surveillance System\nInfluenza-Like Illness\nCase Counts by Week\n'
+                    f'Report Period: {a} to {b}\nGenerated for benchmarking\n\n')
+            f.write('Cases by County and Week' + ',' * (df.shape[1] - 1) + '\n')
+            df.to_csv(f, index=False)
+    return files
+
+
+def synthetic_trends_json(rows: int, file: str, seed: int = 0) -> str:
+    """
+    Writes Google Trends for Health API responses, one per geo, as a JSON list.
+    Each response holds a line of weekly points per term; rows counts points.
+    """
+    if path.isfile(file):
+        return file
+    rng = np.random.default_rng(seed)
+    weeks = pd.date_range('2004-01-04', '2019-12-29', freq='W').strftime('%b %d %Y').tolist()
+    per_geo = len(weeks) * len(TRENDS_TERMS)
+    responses = []
+    for g in range(math.ceil(rows / per_geo)):
+        n_weeks = min(len(weeks), math.ceil((rows - g * per_geo) / len(TRENDS_TERMS)))
+        responses.append({'geo': f'US-MI-{563 + g}', 'lines': [
+            {'term': term, 'points': [{'date': d, 'value': v}
+                                      for d, v in zip(weeks[:n_weeks], rng.gamma(2, 50, n_weeks).tolist())]}
+            for term in TRENDS_TERMS]})
+    with open(file, 'w') as f:
+        json.dump(responses, f)
+    return file
+
+
+def synthetic_raw_dataset(rows: int, file: str, seed: int = 0) -> str:
+    """
+    Writes a weekly raw_dataset.csv as produced by build_raw_dataset, starting in
+    1700 so that long series stay within the datetime64[ns] range.
+    """
+    if path.isfile(file):
+        return file
+    from utils.epiweek_codes import fromdates
+    rng = np.random.default_rng(seed)
+    makedirs(path.dirname(file), exist_ok=True)
+    df = pd.DataFrame({'epiweek': fromdates(weekly_index(rows))})
+    for col in ['cases', 'visits', 'GS_cold', 'GS_cough', 'GS_fever', 'GS_flu',
+                'AWND', 'PRCP', 'SNOW', 'TAVG', 'TMAX', 'TMIN', 'Overall AQI Value',
+                'CO', 'Ozone', 'PM10', 'PM25', 'Days Good', 'Days Moderate', 'Days Unhealthy']:
+        values = rng.gamma(2, 20, rows).round()
+        values[rng.random(rows) < .05] = np.nan
+        df[col] = values
+    df.insert(df.columns.get_loc('CO'), 'Main Pollutant',
+              rng.choice(POLLUTANTS[:4] + ["['Ozone' 'PM2.5']"], rows, p=[.5, .3, .1, .05, .05]))
+    df.to_csv(file, index=False)
+    return file
+
+
+def synthetic_weekly_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Weekly modeling frame with a seasonal 'cases' target and LAGGED_VARIABLES as exog.
+    Frames too long for a datetime64[ns] week index get a RangeIndex instead.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(rows)
+    index = weekly_index(rows) if rows <= MAX_WEEKS else pd.RangeIndex(rows)
+    df = pd.DataFrame(rng.normal(size=(rows, len(LAGGED_VARIABLES))), columns=LAGGED_VARIABLES, index=index)
+    df.insert(0, 'cases', np.round(40 + 30 * np.sin(2 * np.pi * t / 52) + rng.normal(0, 5, rows)).clip(1))
+    return df
+
+
+# Stages
+# ======================================================
+# Each stage is (setup, run, max_rows). setup(rows, workdir, seed) generates or
+# loads the inputs and is not timed; run(inputs) is the timed call and returns
+# the stage's output. Scales above max_rows are skipped.
+
+def setup_epiweek_mapping(rows, workdir, seed):
+    from utils.epiweek_codes import fromdates
+    return fromdates, daily_dates(rows, np.random.default_rng(seed))
+
+
+def setup_syndromic(rows, workdir, seed):
+    from utils.surveillance_datasets import make_syndromic_dataset
+    return make_syndromic_dataset, synthetic_msss(rows, path.join(workdir, 'MSSS.csv'), seed)
+
+
+def setup_aqi(rows, workdir, seed):
+    synthetic_aqi_daily(rows, path.join(workdir, 'src', 'data'), seed)
+    from utils.get_aqi_dataset import get_aqi_dataset
+    return get_aqi_dataset
+
+
+def setup_incidence(rows, workdir, seed):
+    from utils.surveillance_datasets import make_county_incidence_dataset
+    return make_county_incidence_dataset, synthetic_mdss_exports(rows, path.join(workdir, 'src', 'data'), seed)
+
+
+def setup_weather(rows, workdir, seed):
+    from utils.make_weather_dataset import format_dataset
+    df = pd.read_csv(synthetic_ncei_daily(rows, path.join(workdir, 'ncei.csv'), seed))
+    return format_dataset, df[['date', 'datatype', 'value']]
+
+
+def setup_county_weather(rows, workdir, seed):
+    from utils.make_weather_dataset import county_weather
+    df = pd.read_csv(synthetic_ncei_daily(rows, path.join(workdir, 'ncei.csv'), seed), parse_dates=['date'])
+    stations = df['station'].unique()
+    rng = np.random.default_rng(seed)
+    weights = pd.DataFrame({'station': stations, 'county': [f'C{i % 3}' for i in range(len(stations))],
+                            'weight': rng.uniform(0.5, 1.5, len(stations))})
+    return county_weather, df, weights
+
+
+def setup_trends(rows, workdir, seed):
+    from utils.make_google_trends_dataset import format_dataset
+    with open(synthetic_trends_json(rows, path.join(workdir, 'trends.json'), seed)) as f:
+        return format_dataset, json.load(f)
+
+
+def run_trends(inputs):
+    format_dataset, responses = inputs
+    records = [(point['date'], point['value'], line['term'], contents['geo'])
+               for contents in responses
+               for line in contents['lines']
+               for point in line['points']]
+    return format_dataset(pd.DataFrame.from_records(records, columns=['date', 'value', 'term', 'geo']))
+
+
+def setup_preprocess(rows, workdir, seed):
+    synthetic_raw_dataset(rows, path.join(workdir, 'datasets', 'data', 'raw_dataset.csv'), seed)
+    from helper_functions import fetch_preprocess_dataset
+    return fetch_preprocess_dataset, 'raw_dataset.csv'
+
+
+def setup_lag_features(rows, workdir, seed):
+    from helper_functions import lag_features
+    return lag_features, synthetic_weekly_frame(rows, seed)
+
+
+def setup_backtesting(rows, workdir, seed):
+    from sklearn.linear_model import ElasticNet
+    from sklearn.preprocessing import FunctionTransformer, StandardScaler
+    from skforecast.ForecasterAutoreg import ForecasterAutoreg
+    from skforecast.model_selection import backtesting_forecaster
+    forecaster = ForecasterAutoreg(
+        regressor=ElasticNet(random_state=123, l1_ratio=.5),
+        lags=[1, 2, 52],
+        transformer_y=FunctionTransformer(func=np.log1p, inverse_func=np.expm1, validate=True),
+        transformer_exog=StandardScaler())
+    return backtesting_forecaster, forecaster, synthetic_weekly_frame(rows, seed)
+
+
+def run_backtesting(inputs):
+    backtesting_forecaster, forecaster, df = inputs
+    _, preds = backtesting_forecaster(
+        forecaster=forecaster,
+        y=df['cases'],
+        exog=df[LAGGED_VARIABLES],
+        initial_train_size=len(df) - min(104, len(df) // 2),   # two seasons of test weeks, as in '02 Test Models'
+        steps=2,
+        fixed_train_size=True,
+        metric='mean_absolute_error',
+        refit=True,
+        verbose=False,
+        show_progress=False
+    )
+    return preds
+
+
+STAGES = {
+    'epiweek_mapping': (setup_epiweek_mapping, lambda i: i[0](i[1]), 10**8),
+    'syndromic_count': (setup_syndromic, lambda i: i[0](i[1], chunksize=CHUNK_ROWS), 10**8),
+    'aqi_weekly': (setup_aqi, lambda i: i(2005, 2019), 10**8),
+    'incidence_parse': (setup_incidence, lambda i: i[0](i[1]), 10**7),
+    'weather_pivot': (setup_weather, lambda i: i[0](i[1], 'datatype'), 10**8),
+    'weather_county': (setup_county_weather, lambda i: i[0](i[1], i[2]), 10**8),
+    'trends_format': (setup_trends, run_trends, 10**7),
+    'preprocess_resample': (setup_preprocess, lambda i: i[0](i[1], cache=False), MAX_WEEKS),
+    'lag_features': (setup_lag_features, lambda i: i[0](i[1], LAGGED_VARIABLES, lags=3), 10**7),
+    'backtesting': (setup_backtesting, run_backtesting, 10**4),
+}
+
+
+# Runner
+# ======================================================
+
+def prepare_workdir(workdir: str) -> None:
+    """
+    Writes a placeholder config into a scale's data root, which run_stage uses
+    as its working directory. The loaders read their config on first use; the
+    placeholder points their data root at the synthetic files and holds dummy
+    credentials, so nothing is read from the real secrets.ini and nothing is
+    fetched.
+    """
+    config = f'[default]\nroot = {workdir}\nncdc_token = offline\ngtrends_apikey = offline\n'
+    makedirs(path.join(workdir, 'utils'), exist_ok=True)
+    for file in ['secrets.ini', path.join('utils', 'secrets.ini')]:
+        with open(path.join(workdir, file), 'w') as f:
+            f.write(config)
+
+
+def run_stage(
+            name: str,
+            rows: int,
+            workdir: str,
+            seed: int = 0,
+            repeat: int = 1,
+            trace: bool = False,
+            profile: str = None
+            ) -> dict:
+    """
+    Runs one stage at one scale and measures it. Meant to run in a fresh process
+    (see benchmark), so that imports are warm only for this stage and peak RSS
+    belongs to it alone.
+
+    Returns:
+        dict: The stage record: 'seconds' is the fastest of the repeats,
+        'setup_peak_rss_mb' the peak before timing started and 'peak_rss_mb'
+        the peak at the end, so the stage's own memory shows where the latter exceeds the former.
+        With trace or profile, 'substages' totals the instrumented stages the run went through.
+    """
+    root = path.join(workdir, f'rows-{rows}')   # one data root per scale, as loaders use fixed file names
+    prepare_workdir(root)
+    os.chdir(root)
+    sys.path[:0] = [ANALYSIS_PATH, DATASETS_PATH]
+    warnings.filterwarnings('ignore')
+    from utils.instrumentation import configure, peak_rss_mb, summarize_log
+    setup, run, _ = STAGES[name]
+    inputs = setup(rows, root, seed)
+    setup_peak = peak_rss_mb()
+
+    log_file = path.join(root, f'stages-{name}.jsonl')
+    if trace or profile:
+        open(log_file, 'w').close()
+        configure(log_file, profile, path.join(root, 'profiles'))
+
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = run(inputs)
+        seconds.append(time.perf_counter() - start)
+
+    record = {'stage': name, 'rows': rows, 'seconds': min(seconds), 'all_seconds': seconds,
+              'rows_out': len(out), 'setup_peak_rss_mb': setup_peak, 'peak_rss_mb': peak_rss_mb()}
+    if trace or profile:
+        configure(None)
+        record['substages'] = json.loads(summarize_log(log_file).reset_index().to_json(orient='records'))
+    return record
+
+
+def benchmark(
+            stages: list = None,
+            scales: list = DEFAULT_SCALES,
+            workdir: str = None,
+            seed: int = 0,
+            repeat: int = 1,
+            trace: bool = False,
+            profile: str = None,
+            verbose: bool = True
+            ) -> dict:
+    """
+    Benchmarks pipeline stages on synthetic data at several scales, offline.
+
+    Every (stage, scale) runs in its own spawned process. Generated inputs are
+    kept in workdir and reused by later runs with the same workdir and seed.
+
+    Parameters:
+        stages (list): Names from STAGES. Default is None (all stages).
+        scales (list): Input sizes in rows. Default is DEFAULT_SCALES.
+        workdir (str): Directory for generated inputs. Default is None (a new temporary directory).
+        seed (int): Seed of the generators. Default is 0.
+        repeat (int): Timed runs per stage and scale; the fastest is reported. Default is 1.
+        trace (bool): Whether to log the instrumented stages of each run and total them
+            under 'substages'. Default is False.
+        profile (str): An instrumented stage to capture with cProfile (implies trace);
+            .prof files are written under the scale's 'profiles' directory. Default is None.
+        verbose (bool): Whether to print each record as it completes. Default is True.
+
+    Returns:
+        dict: 'meta' describing the run and environment, and 'results', one record per stage and scale.
+    """
+    workdir = path.abspath(workdir or tempfile.mkdtemp(prefix='ili-benchmark-'))
+    results = []
+    for name in stages or list(STAGES):
+        for rows in scales:
+            if rows > STAGES[name][2]:
+                results.append({'stage': name, 'rows': rows, 'skipped': f'above max_rows of {STAGES[name][2]}'})
+                if verbose:
+                    print(f'{name:<20} {rows:>11,} rows  skipped')
+                continue
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as pool:
+                record = pool.submit(run_stage, name, rows, workdir, seed, repeat, trace, profile).result()
+            results.append(record)
+            if verbose:
+                print(f"{name:<20} {rows:>11,} rows  {record['seconds']:9.3f} s  "
+                      f"{record['peak_rss_mb']:9.1f} MB peak")
+
+    versions = {}
+    for module in ['numpy', 'pandas', 'sklearn', 'skforecast', 'statsmodels']:
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+
+    meta = {'created': datetime.now().isoformat(timespec='seconds'), 'seed': seed, 'repeat': repeat,
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'versions': versions}
+    return {'meta': meta, 'results': results}
+
+
+def compare(current: dict, baseline: dict, threshold: float = 1.25) -> pd.DataFrame:
+    """
+    Compares two benchmark results stage by stage.
+
+    Parameters:
+        current (dict): Output of benchmark.
+        baseline (dict): An earlier output of benchmark.
+        threshold (float): Time or memory ratio above which a stage counts as a regression. Default is 1.25.
+
+    Returns:
+        pd.DataFrame: Seconds and peak RSS of both runs by stage and rows, their
+        ratios and a 'regression' flag, for the stages measured in both.
+    """
+    def table(result):
+        records = [r for r in result['results'] if 'skipped' not in r]
+        return pd.DataFrame(records, columns=['stage', 'rows', 'seconds', 'peak_rss_mb'])\
+                 .set_index(['stage', 'rows'])
+
+    df = table(current).join(table(baseline), rsuffix='_baseline', how='inner')
+    df['time_ratio'] = df['seconds'] / df['seconds_baseline']
+    df['memory_ratio'] = df['peak_rss_mb'] / df['peak_rss_mb_baseline']
+    df['regression'] = (df['time_ratio'] > threshold) | (df['memory_ratio'] > threshold)
+    return df
+
+
+# Import-time budget
+# ======================================================
+
+def import_seconds(module: str, repeat: int = 3) -> dict:
+    """
+    Times importing a module in fresh interpreters started in an empty directory,
+    so no secrets.ini is found and nothing imported earlier is warm.
+
+    Returns:
+        dict: 'base_seconds', the time to import pandas and numpy, and 'seconds',
+        the time to import the module after them, each the fastest of the repeats;
+        or 'error' with the interpreter's last line of output if the import failed.
+    """
+    code = ('import time; start = time.perf_counter(); import pandas, numpy; base = time.perf_counter()\n'
+            f'import {module}; end = time.perf_counter(); print(base - start, end - base)')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([ANALYSIS_PATH, DATASETS_PATH]))
+    times = []
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, '-c', code], cwd=cwd, env=env, capture_output=True, text=True)
+            if proc.returncode:
+                return {'error': (proc.stderr.strip().splitlines() or ['failed'])[-1]}
+            times.append([float(v) for v in proc.stdout.split()[-2:]])
+    base, seconds = np.min(times, axis=0)
+    return {'base_seconds': base, 'seconds': seconds}
+
+
+def check_imports(budget: dict = IMPORT_BUDGET, repeat: int = 3) -> pd.DataFrame:
+    """
+    Measures import times against their budget.
+
+    Parameters:
+        budget (dict): Module name to the seconds allowed on top of pandas and numpy. Default is IMPORT_BUDGET.
+        repeat (int): Fresh interpreters per module; the fastest is reported. Default is 3.
+
+    Returns:
+        pd.DataFrame: One row per module with the measured seconds, the budget and
+        'over_budget', which is also set for modules that failed to import.
+    """
+    df = pd.DataFrame([{'module': module, 'budget': allowed, **import_seconds(module, repeat)}
+                       for module, allowed in budget.items()]).set_index('module')
+    df = df.reindex(columns=['base_seconds', 'seconds', 'budget', 'error'])
+    df['over_budget'] = df['error'].notna() | (df['seconds'] > df['budget'])
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark pipeline stages on synthetic data. Needs no secrets.ini and no network.')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), help='stages to run (default: all)')
+    parser.add_argument('--scales', nargs='+', type=float, default=DEFAULT_SCALES, help='row counts, e.g. 1e3 1e5')
+    parser.add_argument('--workdir', help='directory for generated inputs, reused across runs')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--trace', action='store_true', help='record instrumented sub-stages of each run')
+    parser.add_argument('--profile', help='instrumented stage to capture with cProfile, e.g. epiweek_mapping')
+    parser.add_argument('--out', default='benchmark.json', help='where to save results (default: benchmark.json)')
+    parser.add_argument('--baseline', help='earlier results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='ratio counted as a regression')
+    parser.add_argument('--imports', action='store_true',
+                        help='check module import times against IMPORT_BUDGET instead of running stages')
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        table = check_imports(repeat=max(args.repeat, 3))
+        print(table.round(3).to_string())
+        return int(table['over_budget'].any())
+
+    result = benchmark(args.stages, [int(s) for s in args.scales], args.workdir, args.seed, args.repeat,
+                       args.trace, args.profile)
+    with open(args.out, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(result, json.load(f), args.threshold)
+        print(comparison.round(3).to_string())
+        return int(comparison['regression'].any())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
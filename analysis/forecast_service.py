@@ -0,0 +1,280 @@
+import pandas as pd
+import argparse, json, copy, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from skforecast.ForecasterSarimax import ForecasterSarimax
+from skforecast.utils import load_forecaster
+from helper_functions import fetch_preprocess_dataset, lag_features, cyclical_encoding
+from utils.epiweek_codes import fromdates, split
+
+# Forecasters saved by '01 Train Validate Models'
+# ======================================================
+MODEL_FILES = {
+    'ElasticNet': 'ElasticNet_001 hide.py',
+    'RandomForest': 'RandomForest_001 hide.py',
+    'SARIMAX': 'SARIMAX_001 hide.py',
+    'SeasonalNaive': 'baseline_001 hide.py',
+}
+
+# Variables lagged in '01 Train Validate Models' and '02 Test Models'
+LAGGED_VARIABLES = ['GS_cold', 'GS_cough', 'GS_fever', 'GS_flu',
+                    'AWND', 'PRCP','SNOW', 'TAVG','TMAX', 'TMIN',
+                    'Overall AQI Value',
+                    'CO', 'Ozone', 'PM10', 'PM25', 'Days Moderate',
+                    'Days Unhealthy', 'visits','Main Pollutant_CO',
+                    'Main Pollutant_NO2', 'Main Pollutant_PM2.5']
+
+# Columns fetch_preprocess_dataset derives from the week start date
+CALENDAR_COLUMNS = ['epiweek', 'epiweek_sin', 'epiweek_cos']
+
+
+def calendar_features(weeks: pd.DatetimeIndex) -> pd.DataFrame:
+    """
+    Builds the epiweek number and its cyclical encoding for week start dates,
+    as fetch_preprocess_dataset does.
+    """
+    epiweek = pd.Series(split(fromdates(weeks))[1], index=weeks, name='epiweek')
+    return pd.concat([epiweek, cyclical_encoding(epiweek - 1, cycle_length=52)], axis=1)
+
+
+class ForecastService:
+    """
+    Holds the fitted forecasters and the latest weeks of preprocessed data in
+    memory, and keeps 1- to max_steps-week forecasts ready for every model.
+
+    Forecasts are recomputed only when data is added with update(), so reading
+    them costs a dictionary lookup.
+
+    Parameters:
+        df (pd.DataFrame): Preprocessed weekly frame as returned by fetch_preprocess_dataset,
+            without lag columns; weeks whose 'cases' are not yet known may hold exog only.
+        forecasters (dict): Model name to a fitted forecaster or a file for load_forecaster.
+            Default is MODEL_FILES.
+        target (str): The target column. Default is 'cases'.
+        variables (list): Variables to build lag features for. Default is LAGGED_VARIABLES.
+        lags (int): Lag depth of the lag features. Default is 3.
+        max_steps (int): Longest horizon kept ready. Default is 2.
+    """
+
+    def __init__(
+                self,
+                df: pd.DataFrame,
+                forecasters: dict = MODEL_FILES,
+                target: str = 'cases',
+                variables: list = LAGGED_VARIABLES,
+                lags: int = 3,
+                max_steps: int = 2
+                ):
+        self.forecasters = {name: load_forecaster(f, verbose=False) if isinstance(f, str) else f
+                            for name, f in forecasters.items()}
+        self.target, self.variables, self.lags, self.max_steps = target, variables, lags, max_steps
+        self.lock = threading.Lock()
+        # Weeks kept in memory: the longest autoregressive window plus the lag
+        # depth and the weeks of exog that may arrive ahead of the cases. SARIMAX
+        # models additionally need every week since the end of their fit.
+        self.window_size = max([f.window_size for f in self.forecasters.values()
+                                if not isinstance(f, ForecasterSarimax)] + [0]) + lags + max_steps
+        self.df = df
+        self.forecasts = {}
+        self.refresh()
+
+    def update(self, rows: pd.DataFrame):
+        """
+        Adds or replaces weeks of preprocessed data and recomputes the forecasts.
+        Models are not reloaded or refitted. If the forecasts cannot be
+        recomputed, the error is raised and the service keeps its previous data.
+
+        Rows need not carry every column. The calendar columns are derived
+        from the week, and other exog left out keeps the week's current value
+        or, for a new week, the latest earlier one, as features() would carry
+        it forward.
+
+        Parameters:
+            rows (pd.DataFrame): Weekly rows holding some of the initial frame's columns.
+        """
+        unknown = rows.columns.difference(self.df.columns)
+        if len(unknown):
+            raise KeyError(f'Unknown columns: {list(unknown)}')
+        with self.lock:
+            exog = self.df.drop(columns=[self.target])
+            current = pd.concat([self.df[self.target].reindex(rows.index),
+                                 exog.reindex(exog.index.union(rows.index)).ffill().loc[rows.index]], axis=1)
+            rows = rows.reindex(columns=self.df.columns).combine_first(current)[self.df.columns]
+            rows = rows.astype({c: t for c, t in self.df.dtypes.items() if rows[c].notna().all()})
+            df = pd.concat([self.df.drop(index=rows.index, errors='ignore'), rows])
+            self.refresh(df.sort_index().asfreq('W'))
+
+    def features(self, df: pd.DataFrame) -> tuple:
+        """
+        Extends a frame through the forecast horizon and adds its lag features.
+
+        Weeks after the last observed target are added up to max_steps ahead.
+        Calendar columns are recomputed for every week, raw exogenous values are
+        carried forward where they are not known yet, and the lag features are
+        built over the extended frame, so lag 1 of the first future week is the
+        last observed week.
+
+        Parameters:
+            df (pd.DataFrame): Weekly frame without lag columns.
+
+        Returns:
+            tuple: The observed target (pd.Series), the extended frame with lag
+            features (pd.DataFrame) and the future weeks (pd.DatetimeIndex).
+        """
+        y = df[self.target].dropna()
+        future = pd.date_range(y.index[-1] + pd.Timedelta(weeks=1), periods=self.max_steps, freq='W')
+        frame = df.reindex(df.index.union(future)).asfreq('W')
+        calendar = [c for c in CALENDAR_COLUMNS if c in frame]
+        raw = [c for c in frame.columns if c != self.target and c not in calendar]
+        frame[raw] = frame[raw].ffill().infer_objects()
+        if calendar:
+            frame[calendar] = calendar_features(frame.index)[calendar]
+        frame = pd.concat([frame, lag_features(frame, self.variables, self.lags)], axis=1)
+        return y, frame, future
+
+    def refresh(self, df: pd.DataFrame = None):
+        """
+        Recomputes every model's forecasts from the latest observed week of df.
+        The service's data and forecasts are replaced only once every model has
+        forecast, so a failure leaves both as they were.
+
+        Parameters:
+            df (pd.DataFrame): Weekly frame to forecast from. Default is None (the current data).
+        """
+        df = self.df if df is None else df
+        sarimax_starts = [f.extended_index[-1] for f in self.forecasters.values()
+                          if isinstance(f, ForecasterSarimax)]
+        keep_from = min([df.index[-1] - pd.Timedelta(weeks=self.window_size)] + sarimax_starts)
+        df = df.loc[keep_from:]
+
+        y, frame, future = self.features(df)
+        origin = y.index[-1]
+        known = frame.drop(columns=[self.target])
+        exog_future = known.loc[future]
+
+        forecasts = {}
+        for name, forecaster in self.forecasters.items():
+            cols = getattr(forecaster, 'exog_col_names', None)
+            exog = None if cols is None else exog_future[cols]
+            if isinstance(forecaster, ForecasterSarimax):
+                forecaster = copy.deepcopy(forecaster)        # predict() appends to the fitted state
+                since_fit = y.loc[forecaster.extended_index[-1]:].iloc[1:]
+                pred = forecaster.predict(self.max_steps,
+                                          last_window=since_fit if len(since_fit) else None,
+                                          last_window_exog=known.loc[since_fit.index, cols] if len(since_fit) and cols else None,
+                                          exog=exog)
+            elif cols is None:
+                pred = forecaster.predict(self.max_steps, last_window=y.iloc[-forecaster.window_size:])
+            else:
+                pred = forecaster.predict(self.max_steps, last_window=y.iloc[-forecaster.window_size:], exog=exog)
+            forecasts[name] = {str(week.date()): float(value) for week, value in pred.items()}
+
+        self.df = df
+        self.forecasts = {'origin': str(origin.date()), 'forecasts': forecasts}
+
+    def forecast(self, steps: int = None, models: list = None) -> dict:
+        """
+        Returns the current forecasts, optionally for fewer steps or fewer models.
+        """
+        current = self.forecasts
+        steps = steps or self.max_steps
+        return {'origin': current['origin'],
+                'forecasts': {name: dict(list(pred.items())[:steps])
+                              for name, pred in current['forecasts'].items()
+                              if models is None or name in models}}
+
+
+def make_handler(service: ForecastService):
+    """
+    Builds the request handler class serving a ForecastService.
+
+    Routes:
+        GET  /forecast?steps=2&model=ElasticNet  Current forecasts; model may repeat.
+        POST /update                             JSON rows {week start: {column: value}}.
+        GET  /health                             Liveness check.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def send_json(self, status: int, body: dict):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            if url.path == '/health':
+                self.send_json(200, {'status': 'ok'})
+            elif url.path == '/forecast':
+                try:
+                    steps = int(query.get('steps', [service.max_steps])[0])
+                except ValueError:
+                    return self.send_json(400, {'error': 'steps must be an integer'})
+                if not 1 <= steps <= service.max_steps:
+                    return self.send_json(400, {'error': f'steps must be between 1 and {service.max_steps}'})
+                self.send_json(200, service.forecast(steps, query.get('model')))
+            else:
+                self.send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            if urlparse(self.path).path != '/update':
+                return self.send_json(404, {'error': 'not found'})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                rows = pd.DataFrame.from_dict(body, orient='index')
+                rows.index = pd.to_datetime(rows.index)
+                service.update(rows)
+            except (ValueError, KeyError) as e:
+                return self.send_json(400, {'error': str(e)})
+            except Exception as e:                      # e.g. a model failing to forecast; the data is unchanged
+                return self.send_json(500, {'error': f'{type(e).__name__}: {e}'})
+            self.send_json(200, service.forecast())
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(service: ForecastService, host: str = '127.0.0.1', port: int = 8000) -> ThreadingHTTPServer:
+    """
+    Starts serving a ForecastService in a background thread.
+
+    Parameters:
+        service (ForecastService): The service to expose.
+        host (str): Interface to bind. Default is '127.0.0.1'.
+        port (int): Port to bind; 0 picks a free port. Default is 8000.
+
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve forecasts of the saved models from the preprocessed dataset.')
+    parser.add_argument('--host', default='127.0.0.1', help='interface to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='port to bind (default: 8000)')
+    parser.add_argument('--max-steps', type=int, default=2, help='longest horizon kept ready (default: 2)')
+    args = parser.parse_args(argv)
+
+    service = ForecastService(fetch_preprocess_dataset(), MODEL_FILES, max_steps=args.max_steps)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f'Serving forecasts on http://{args.host}:{server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,60 @@
 import pandas as pd
 import numpy as np
 import math
-from os import path
+import sys
+import hashlib
+import json
+import warnings
+from os import path, makedirs, replace, getpid
 import configparser
-from epiweeks import Week
 from datetime import date, datetime
 from calendar import month_name, month_abbr
-import matplotlib.pyplot as plt
-from statsmodels.tsa.stattools import adfuller
-import matplotlib.pyplot as plt
-from datetime import date
-from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error, mean_squared_error
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', 'datasets'))
+from utils.config import setting
+from utils.epiweek_codes import fromstrings, split, startdates
+from utils.instrumentation import instrumented, stage
+
+# matplotlib, statsmodels, scipy and sklearn are imported inside the functions
+# that use them, and secrets.ini is read on first use, so importing this module
+# (e.g. in every backtesting worker) costs little more than pandas itself.
+
 
 # Reading Secrets
 # ======================================================
-cfg = configparser.ConfigParser()
-cfg.read('secrets.ini')
-ROOT_PATH = path.abspath(cfg.get('default','root'))
-DATA_PATH = path.join(ROOT_PATH, 'datasets/data')
+def data_path() -> str:
+    """
+    Directory of the datasets, from the root set in secrets.ini.
+    """
+    return path.join(path.abspath(setting('root', file='secrets.ini')), 'datasets/data')
+
+
+def cache_path() -> str:
+    """
+    Directory of the preprocessing and stationarity caches.
+    """
+    return path.join(data_path(), 'cache')
+
+
+# Part of the preprocessing cache key: bump it whenever fetch_preprocess_dataset
+# changes what it produces, so frames cached by earlier code are not served.
+PREPROCESS_VERSION = 2
+
+
+def __getattr__(name):
+    # ROOT_PATH, DATA_PATH and CACHE_PATH used to be read at import; they are
+    # still available as module attributes, resolved when first accessed.
+    if name == 'ROOT_PATH':
+        return path.abspath(setting('root', file='secrets.ini'))
+    if name == 'DATA_PATH':
+        return data_path()
+    if name == 'CACHE_PATH':
+        return cache_path()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+@instrumented('preprocess')
 def fetch_preprocess_dataset(file: str = 'raw_dataset.csv', 
                             col_ordered: set = 
                                             (
@@ -31,23 +66,46 @@ def fetch_preprocess_dataset(file: str = 'raw_dataset.csv',
                                             'CO', 'Ozone', 'PM10', 
                                             'PM25', 'Days Good',
                                             'Days Moderate', 'Days Unhealthy'
-                                            )
+                                            ),
+                            cache: bool = True,
+                            compact: bool = False,
+                            mmap: bool = False,
+                            verbose: bool = True
                             ):
     """
     Fetches and preprocesses the dataset.
 
+    The preprocessed frame is cached as an uncompressed Feather file in cache_path(),
+    keyed by a hash of the source file's contents, col_ordered and
+    PREPROCESS_VERSION. Later calls read the cached file instead of
+    preprocessing again. With mmap, numeric columns are read-only views of the
+    memory-mapped file rather than copies, so worker processes loading the same
+    dataset share one on-disk copy (see read_cached_frame).
+
     Args:
         file (str): The name of the dataset file. Default is 'raw_dataset.csv'.
         col_ordered (set): The ordered set of column names. Default is a predefined set of column names.
+        cache (bool): Whether to read from and write to the cache. Default is True.
+        compact (bool): Whether to shrink column dtypes with compact_frame. Default is False.
+        mmap (bool): Whether to return read-only, zero-copy columns from the cache. Default is False.
+        verbose (bool): Whether compact_frame prints the memory saved. Default is True.
 
     Returns:
         pandas.DataFrame: The preprocessed dataset.
     """
-    df = pd.read_csv(path.join(DATA_PATH, file))
-    df['epiweek'] = df['epiweek'].map(lambda x: Week.fromstring(str(x)))
-    df['weekstart'] = pd.to_datetime(df['epiweek'].map(lambda x: Week.startdate(x)))
+    if cache:
+        cached = preprocess_cache_file(path.join(data_path(), file), col_ordered)
+        if path.isfile(cached):
+            df = read_cached_frame(cached, mmap)
+            return compact_frame(df, verbose=verbose) if compact else df
+
+    with stage('preprocess_read', file=file) as record:
+        df = pd.read_csv(path.join(data_path(), file))
+        record['rows_out'] = len(df)
+    codes = fromstrings(df['epiweek'])
+    df['weekstart'] = pd.to_datetime(startdates(codes).astype('datetime64[ns]'))
     df.set_index('weekstart', inplace=True)
-    df['epiweek'] = df['epiweek'].map(lambda x: int(str(x)[4:]))
+    df['epiweek'] = split(codes)[1]
 
     means = df[list(col_ordered)].groupby(df.index.month).mean()
     means.index.name = 'month'
@@ -70,7 +128,119 @@ def fetch_preprocess_dataset(file: str = 'raw_dataset.csv',
     epiweek_encoded = cyclical_encoding(df['epiweek'].apply(lambda x: x-1), cycle_length=52)  # Cyclical encoding 'epiweek' to capture 
     df = pd.concat([df, epiweek_encoded], axis=1)                                             # the cyclic nature of weeks in a year
     df = df.reset_index().set_index('weekstart').drop(columns=['month']).resample('W').first().fillna(method='ffill')
-        
+
+    if cache:
+        write_cached_frame(df, cached)
+    return compact_frame(df, verbose=verbose) if compact else df
+
+def compact_frame(df: pd.DataFrame, rtol: float = 1e-6, verbose: bool = True) -> pd.DataFrame:
+    """
+    Shrinks the dtypes of a modeling frame and reports the memory saved.
+
+    Indicator columns (the one-hot dummies, already bool or uint8 holding only
+    0/1) become bool. Other integer-valued columns without missing values
+    (counts, epiweek) become the smallest signed integer type that holds them,
+    even when every value is 0 or 1, so they keep behaving as numbers.
+    Remaining float columns become float32 when every value survives the
+    conversion within rtol.
+
+    Args:
+        df (pd.DataFrame): The frame to compact.
+        rtol (float): Largest relative error allowed when casting to float32. Default is 1e-6.
+        verbose (bool): Whether to print the memory before and after. Default is True.
+
+    Returns:
+        pandas.DataFrame: The frame with compact dtypes.
+    """
+    before = df.memory_usage(deep=True).sum()
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == bool or not (pd.api.types.is_numeric_dtype(s) or s.dtype == object):
+            out[col] = s
+            continue
+        values = pd.to_numeric(s, errors='coerce')
+        if values.isna().sum() > s.isna().sum():     # holds non-numeric text
+            out[col] = s
+            continue
+        v = values.to_numpy(dtype=float)
+        finite = v[~np.isnan(v)]
+        if s.dtype == np.uint8 and np.isin(finite, (0, 1)).all():
+            out[col] = values.astype(bool)
+        elif not np.isnan(v).any() and (finite == np.round(finite)).all():
+            out[col] = pd.to_numeric(values.astype(np.int64), downcast='integer')
+        elif np.allclose(v, v.astype(np.float32), rtol=rtol, atol=0, equal_nan=True):
+            out[col] = values.astype(np.float32)
+        else:
+            out[col] = values
+    result = pd.DataFrame(out, index=df.index)
+    if isinstance(df.index, pd.DatetimeIndex):
+        result.index.freq = df.index.freq
+
+    if verbose:
+        after = result.memory_usage(deep=True).sum()
+        print(f"Memory: {before / 1024:.1f} KB --> {after / 1024:.1f} KB ({before / max(after, 1):.1f}x smaller)")
+    return result
+
+def preprocess_cache_file(source: str, col_ordered) -> str:
+    """
+    Returns the cache file for a preprocessed dataset.
+
+    Parameters:
+        source (str): Path of the raw dataset file.
+        col_ordered (iterable): The col_ordered argument of fetch_preprocess_dataset.
+
+    Returns:
+        str: Path of the Feather file in cache_path().
+    """
+    h = hashlib.sha256()
+    with open(source, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    h.update(repr((tuple(col_ordered), PREPROCESS_VERSION)).encode())
+    return path.join(cache_path(), f'{h.hexdigest()[:16]}.feather')
+
+def write_cached_frame(df: pd.DataFrame, file: str):
+    """
+    Writes a weekly frame to an uncompressed Feather file so it can be memory-mapped.
+    The file is written under a temporary name and renamed, so concurrent readers
+    never see a partial file.
+
+    Parameters:
+        df (pd.DataFrame): Frame with a DatetimeIndex.
+        file (str): Destination path.
+    """
+    makedirs(path.dirname(file), exist_ok=True)
+    tmp = f'{file}.{getpid()}.tmp'
+    df.reset_index().to_feather(tmp, compression='uncompressed')
+    replace(tmp, file)
+
+def read_cached_frame(file: str, mmap: bool = False) -> pd.DataFrame:
+    """
+    Reads a frame written by write_cached_frame and restores its index and 'W' frequency.
+
+    With mmap, numeric columns without missing values are zero-copy, read-only
+    views of the memory-mapped file, each in its own block so that pandas does
+    not consolidate (copy) them; bools, which Arrow bit-packs, and columns with
+    missing values are still converted. Writing into such a frame in place
+    raises, so use it only where the frame is read, e.g. by backtesting workers.
+    Otherwise the columns are copied into an ordinary, writable frame.
+
+    Parameters:
+        file (str): Path of the Feather file.
+        mmap (bool): Whether to return zero-copy, read-only columns. Default is False.
+
+    Returns:
+        pandas.DataFrame: The cached frame.
+    """
+    from pyarrow import feather
+    table = feather.read_table(file, memory_map=mmap)
+    name = table.column_names[0]
+    index = pd.DatetimeIndex(table.column(0).to_numpy(), name=name, freq='W')
+    table = table.drop([name])
+    df = table.to_pandas(split_blocks=True, self_destruct=True) if mmap else table.to_pandas()
+    del table                                   # self_destruct leaves the table unusable
+    df.index = index
     return df
 
 def train_test_validate_split(df: pd.DataFrame, end_train: date, end_validation: date):
@@ -127,6 +297,7 @@ def metrics(preds, actual):
     Returns:
         tuple: A tuple containing the MAE and RMSE.
     """
+    from sklearn.metrics import mean_absolute_error, mean_squared_error
     mae = mean_absolute_error(actual, preds)
     rmse = math.sqrt(mean_squared_error(actual, preds))
     return mae, rmse
@@ -162,6 +333,61 @@ def cyclical_encoding(data: pd.Series, cycle_length: int) -> pd.DataFrame:
     return result
 
 
+@instrumented('lag_features')
+def lag_features(
+                df: pd.DataFrame, 
+                variables: list, 
+                lags=3, 
+                dtype=np.float64, 
+                keep: list = None
+                ) -> pd.DataFrame:
+    """
+    Build lagged copies of several variables in one array operation.
+
+    All lags are taken from a single strided window view over the selected
+    columns, so the result is one contiguous block rather than one inserted
+    column per lag. Columns are named f'{variable}_L{lag}' and ordered by
+    variable, then lag, as in the notebooks' original shift loop.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame holding the variables to lag.
+    variables : list
+        Names of the columns to lag.
+    lags : int or list, optional
+        Lags to build. An integer n builds lags 1 to n. Default is 3.
+    dtype : numpy dtype, optional
+        Floating dtype of the result, e.g. np.float32. Default is np.float64.
+    keep : list, optional
+        Only emit lag columns whose names appear in keep, e.g. a fitted
+        forecaster's exog_col_names. Default is None (emit every lag).
+
+    Returns
+    -------
+    result : pd.DataFrame
+        Lag features indexed like df, with NaN where a lag reaches before
+        the first row.
+    """
+    lags = np.arange(1, lags + 1) if np.isscalar(lags) else np.asarray(lags)
+    columns = [f'{v}_L{i}' for v in variables for i in lags]
+    if keep is not None:
+        wanted = set(keep)
+        selected = [j for j, c in enumerate(columns) if c in wanted]
+    else:
+        selected = slice(None)
+
+    values = df[list(variables)].to_numpy(dtype=dtype)
+    max_lag = int(lags.max())
+    padded = np.vstack([np.full((max_lag, values.shape[1]), np.nan, dtype=dtype), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, max_lag + 1, axis=0)   # (rows, variables, max_lag + 1)
+    lagged = windows[:, :, max_lag - lags].reshape(len(df), -1)[:, selected]
+
+    return pd.DataFrame(np.ascontiguousarray(lagged), 
+                        index=df.index, 
+                        columns=np.asarray(columns, dtype=object)[selected])
+
+
 def ADF(time_series, max_lags):
     """
     Calculate and print the results of the Augmented Dickey-Fuller (ADF) test.
@@ -179,6 +405,7 @@ def ADF(time_series, max_lags):
     lags: The number of lags used in the test.
     Critical Values: The critical values at different confidence levels.
     """
+    from statsmodels.tsa.stattools import adfuller
     t_stat, p_value, lags, _, critical_values, _ = adfuller(
                                                             time_series,
                                                             maxlag=max_lags
@@ -191,6 +418,84 @@ def ADF(time_series, max_lags):
         print(f'   {key}, {value:.2f}')
 
 
+def stationarity_tests(values: np.ndarray, max_lags=None, with_kpss: bool = False) -> list:
+    """
+    Run ADF (and optionally KPSS) on one series.
+
+    Parameters:
+    values (np.ndarray): The series, without missing values.
+    max_lags (int): The maximum number of lags for ADF. Default is None (statsmodels' default).
+    with_kpss (bool): Whether to also run KPSS. Default is False.
+
+    Returns:
+    list: One dict per test with test, statistic, p-value, lags and critical values.
+    """
+    from statsmodels.tsa.stattools import adfuller, kpss
+    t_stat, p_value, lags, _, critical_values, _ = adfuller(values, maxlag=max_lags)
+    rows = [{'test': 'ADF', 'statistic': float(t_stat), 'p-value': float(p_value), 'lags': int(lags),
+             **{f'critical {k}': v for k, v in critical_values.items()}}]
+    if with_kpss:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')  # kpss warns when the p-value is outside its lookup table
+            t_stat, p_value, lags, critical_values = kpss(values, nlags='auto')
+        rows.append({'test': 'KPSS', 'statistic': float(t_stat), 'p-value': float(p_value), 'lags': int(lags),
+                     **{f'critical {k}': v for k, v in critical_values.items()}})
+    return rows
+
+
+def stationarity_table(
+                    df: pd.DataFrame, 
+                    max_lags=None, 
+                    with_kpss: bool = False, 
+                    max_workers: int = None, 
+                    cache: bool = True
+                    ) -> pd.DataFrame:
+    """
+    Run stationarity tests on every column of a frame in a process pool.
+
+    Results are cached per column under cache_path(), keyed by a hash of the
+    column's values and the test settings, so unchanged columns are not retested.
+
+    Parameters:
+    df (pd.DataFrame): The series to test, one per column. Missing values are dropped.
+    max_lags (int): The maximum number of lags for ADF. Default is None (statsmodels' default).
+    with_kpss (bool): Whether to also run KPSS. Default is False.
+    max_workers (int): Number of worker processes. Default is None (the CPU count).
+    cache (bool): Whether to read from and write to the cache. Default is True.
+
+    Returns:
+    pandas.DataFrame: One row per column and test with the statistic, p-value,
+    lags used and critical values.
+    """
+    results, pending = {}, {}
+    folder = path.join(cache_path(), 'stationarity') if cache else None     # cache_path() needs secrets.ini
+    for col in df.columns:
+        values = df[col].dropna().to_numpy(dtype=float)
+        file = None
+        if cache:
+            key = hashlib.sha256(values.tobytes() + repr((max_lags, with_kpss)).encode()).hexdigest()[:16]
+            file = path.join(folder, f'{key}.json')
+        if cache and path.isfile(file):
+            with open(file) as f:
+                results[col] = json.load(f)
+        else:
+            pending[col] = (values, file)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers) as pool:
+            futures = {col: pool.submit(stationarity_tests, values, max_lags, with_kpss)
+                       for col, (values, _) in pending.items()}
+            for col, future in futures.items():
+                results[col] = future.result()
+                if cache:
+                    makedirs(path.dirname(pending[col][1]), exist_ok=True)
+                    with open(pending[col][1], 'w') as f:
+                        json.dump(results[col], f)
+
+    rows = [{'variable': col, **row} for col in df.columns for row in results[col]]
+    return pd.DataFrame(rows)
+
+
 def plot_ccf_manual(target, exog, nlags=10):
     """
     Plot Cross Correlation Function (CCF) using manual calculations.
@@ -203,13 +508,10 @@ def plot_ccf_manual(target, exog, nlags=10):
     Returns:
     None
     """
-    lags = []
-    ccfs = []
-    for i in np.arange(0,nlags+1):
-        lags.append(i)
-        ccfs.append(crosscorr(target, exog, lag=i))
+    import matplotlib.pyplot as plt
+    ccfs, _ = ccf_matrix(target, exog.to_frame(), nlags=nlags)
 
-    _ = plt.stem(lags, ccfs, use_line_collection=True)
+    _ = plt.stem(ccfs.columns, ccfs.iloc[0], use_line_collection=True)
     _ = plt.title(f"Cross Correlation (Manual): {target.name} & {exog.name}")
     plt.show()
     plt.close()
@@ -235,4 +537,104 @@ def crosscorr(x: pd.Series, y: pd.Series, lag: int=0) -> float:
     crosscorr : float
         The cross correlation value between x and y with the specified lag.
     """
-    return x.corr(y.shift(lag))
\ No newline at end of file
+    return x.corr(y.shift(lag))
+
+
+def lagged_sums(a: np.ndarray, b: np.ndarray, nlags: int) -> np.ndarray:
+    """
+    Sum over t of a[t] * b[t - lag] for every lag from 0 to nlags, via FFT.
+
+    Parameters
+    ----------
+    a : np.ndarray
+        Array of shape (n,).
+    b : np.ndarray
+        Array of shape (n, k).
+    nlags : int
+        Largest lag.
+
+    Returns
+    -------
+    sums : np.ndarray
+        Array of shape (nlags + 1, k).
+    """
+    n = len(a)
+    size = 1 << int(np.ceil(np.log2(2 * n)))
+    fa = np.fft.rfft(a, size)
+    fb = np.fft.rfft(b, size, axis=0)
+    return np.fft.irfft(fa[:, None] * np.conj(fb), size, axis=0)[:nlags + 1]
+
+
+def ccf_matrix(target: pd.Series, exog: pd.DataFrame, nlags: int = 52):
+    """
+    Cross correlations of a target with every exogenous variable at every lag.
+
+    Entry (variable, lag) equals crosscorr(target, exog[variable], lag), i.e.
+    the Pearson correlation of target[t] with variable[t - lag] over the weeks
+    where both are present. All sums over overlapping pairs are taken for all
+    lags and variables at once with FFT-based correlation, and p-values are
+    those of scipy.stats.pearsonr for the same pairs.
+
+    Parameters
+    ----------
+    target : pd.Series
+        The target time series.
+    exog : pd.DataFrame
+        Exogenous time series, aligned with target.
+    nlags : int, optional
+        Largest lag. Default is 52.
+
+    Returns
+    -------
+    ccf : pd.DataFrame
+        Correlations with one row per variable and one column per lag.
+    pvalues : pd.DataFrame
+        Two-sided p-values of the same shape.
+    """
+    x = target.to_numpy(dtype=float)
+    y = exog.to_numpy(dtype=float)
+    mx, my = ~np.isnan(x), ~np.isnan(y)
+    x = np.where(mx, x - np.nanmean(x), 0)              # centering keeps the sums
+    y = np.where(my, y - np.nanmean(y, axis=0), 0)      # well conditioned
+    mx, my = mx.astype(float), my.astype(float)
+
+    n = lagged_sums(mx, my, nlags)
+    sx, sxx = lagged_sums(x, my, nlags), lagged_sums(x ** 2, my, nlags)
+    sy, syy = lagged_sums(mx, y, nlags), lagged_sums(mx, y ** 2, nlags)
+    sxy = lagged_sums(x, y, nlags)
+
+    n = np.round(n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx ** 2) * (n * syy - sy ** 2))
+        r = np.clip(r, -1, 1)
+        t = r * np.sqrt((n - 2) / (1 - r ** 2))
+    from scipy.stats import t as t_dist
+    p = 2 * t_dist.sf(np.abs(t), n - 2)
+
+    lags = np.arange(nlags + 1)
+    return (pd.DataFrame(r.T, index=exog.columns, columns=lags),
+            pd.DataFrame(p.T, index=exog.columns, columns=lags))
+
+
+def corr_pvalues(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Two-sided p-values of the pairwise Pearson correlations of df.corr(),
+    matching scipy.stats.pearsonr, computed for all pairs at once.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Frame of variables.
+
+    Returns
+    -------
+    pvalues : pd.DataFrame
+        Square frame of p-values with df's columns as index and columns.
+    """
+    from scipy.stats import t as t_dist
+    present = df.notna().to_numpy(dtype=float)
+    n = present.T @ present
+    r = np.clip(df.corr().to_numpy(), -1, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = r * np.sqrt((n - 2) / (1 - r ** 2))
+    return pd.DataFrame(2 * t_dist.sf(np.abs(t), n - 2), index=df.columns, columns=df.columns)
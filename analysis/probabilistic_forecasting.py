@@ -0,0 +1,118 @@
+import pandas as pd
+import numpy as np
+import warnings
+from numpy.lib.stride_tricks import sliding_window_view
+from skforecast.ForecasterAutoreg import ForecasterAutoreg
+from skforecast.utils import transform_series, transform_dataframe
+
+# Quantile levels of CDC FluSight submissions
+# ======================================================
+FLUSIGHT_QUANTILES = [0.01, 0.025, *np.round(np.arange(0.05, 0.951, 0.05), 2).tolist(), 0.975, 0.99]
+
+
+def bootstrap_paths(
+                forecaster: ForecasterAutoreg,
+                y: pd.Series,
+                origins: np.ndarray,
+                exog: pd.DataFrame = None,
+                steps: int = 2,
+                n_boot: int = 2000,
+                random_state: int = 123
+                ) -> np.ndarray:
+    """
+    Simulates bootstrapped forecast paths from many origins at once.
+
+    Equivalent to ForecasterAutoreg.predict_bootstrapping called at every origin,
+    but all origins and paths advance together: each step is a single
+    regressor.predict call on an (origins * n_boot, features) matrix, and the
+    in-sample residuals for every path and step are drawn up front.
+
+    Parameters:
+        forecaster (ForecasterAutoreg): A fitted forecaster with in-sample residuals.
+        y (pd.Series): Target series; the forecast at origin i uses y[:i].
+        origins (np.ndarray): Positions in y of the first forecast week, each at least forecaster.max_lag.
+        exog (pd.DataFrame): Exogenous variables aligned with y. Default is None.
+        steps (int): Number of weeks simulated per path. Default is 2.
+        n_boot (int): Number of paths per origin. Default is 2000.
+        random_state (int): Seed of the residual draws. Default is 123.
+
+    Returns:
+        np.ndarray: Simulated values on the original scale, shape (origins, n_boot, steps).
+        Steps whose week falls beyond the end of y are NaN.
+    """
+    if forecaster.differentiation is not None:
+        raise ValueError('bootstrap_paths does not support differentiated forecasters.')
+    origins = np.asarray(origins)
+    max_lag, lags = forecaster.max_lag, np.asarray(forecaster.lags)
+
+    yt = transform_series(y, forecaster.transformer_y, fit=False, inverse_transform=False).to_numpy(dtype=float)
+    if forecaster.included_exog:
+        exog = exog[forecaster.exog_col_names]
+        exog_values = transform_dataframe(exog, forecaster.transformer_exog,
+                                          fit=False, inverse_transform=False).to_numpy(dtype=float)
+
+    rng = np.random.default_rng(random_state)
+    residuals = rng.choice(forecaster.in_sample_residuals, size=(len(origins), n_boot, steps), replace=True)
+
+    paths = np.full((len(origins), n_boot, max_lag + steps), np.nan)
+    paths[:, :, :max_lag] = sliding_window_view(yt, max_lag)[origins - max_lag][:, None, :]
+
+    for step in range(steps):
+        valid = np.searchsorted(origins + step, len(y))   # origins are sorted, so the valid ones are a prefix
+        X = paths[:valid, :, max_lag + step - lags].reshape(valid * n_boot, len(lags))
+        if forecaster.included_exog:
+            rows = np.repeat(exog_values[origins[:valid] + step], n_boot, axis=0)
+            X = np.column_stack((X, rows))
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            pred = forecaster.regressor.predict(X).reshape(valid, n_boot)
+        paths[:valid, :, max_lag + step] = pred + residuals[:valid, :, step]
+
+    paths = np.ascontiguousarray(paths[:, :, max_lag:])
+    if forecaster.transformer_y is not None:
+        flat = paths.reshape(-1, 1)
+        done = ~np.isnan(flat[:, 0])
+        flat[done] = forecaster.transformer_y.inverse_transform(flat[done])
+    return paths
+
+
+def backtesting_quantiles(
+                        forecaster: ForecasterAutoreg,
+                        y: pd.Series,
+                        initial_train_size: int,
+                        exog: pd.DataFrame = None,
+                        steps: int = 2,
+                        quantiles: list = FLUSIGHT_QUANTILES,
+                        n_boot: int = 2000,
+                        random_state: int = 123
+                        ) -> dict:
+    """
+    Quantile forecasts for every week after the training window, one table per horizon.
+
+    A forecast is issued from every week of the test period with the fitted
+    forecaster (as backtesting_forecaster with refit=False), by simulating
+    n_boot bootstrapped residual paths (see bootstrap_paths).
+
+    Parameters:
+        forecaster (ForecasterAutoreg): A fitted forecaster, e.g. from load_forecaster.
+        y (pd.Series): Target series covering the training and test periods.
+        initial_train_size (int): Number of observations before the first forecast week.
+        exog (pd.DataFrame): Exogenous variables aligned with y. Default is None.
+        steps (int): Longest horizon. Default is 2.
+        quantiles (list): Quantile levels, in increasing order. Default is FLUSIGHT_QUANTILES.
+        n_boot (int): Number of paths per forecast. Default is 2000.
+        random_state (int): Seed of the residual draws. Default is 123.
+
+    Returns:
+        dict: Horizon to a DataFrame indexed by target week with one column per
+        quantile level. Saved with to_csv, the tables can be read back with
+        scoring.load_predictions(columns=quantiles).
+    """
+    origins = np.arange(initial_train_size, len(y))
+    paths = bootstrap_paths(forecaster, y, origins, exog, steps, n_boot, random_state)
+    tables = {}
+    for step in range(steps):
+        valid = origins + step < len(y)
+        values = np.quantile(paths[valid, :, step], quantiles, axis=1).T
+        tables[step + 1] = pd.DataFrame(values, index=y.index[origins[valid] + step], columns=quantiles)
+    return tables
@@ -0,0 +1,252 @@
+import pandas as pd
+import numpy as np
+import json, hashlib, warnings
+from os import path, cpu_count
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from sklearn.model_selection import ParameterGrid
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+
+def candidate_key(candidate: dict) -> str:
+    """
+    Returns the string identifying a candidate in the results store.
+    """
+    return json.dumps({k: candidate[k] for k in ('order', 'seasonal_order', 'trend')}, sort_keys=True)
+
+
+def complexity(candidate: dict) -> int:
+    """
+    Number of AR and MA terms in a candidate; candidates are run in this order
+    so that nested, smaller models are usually fitted first.
+    """
+    p, _, q = candidate['order']
+    P, _, Q, _ = candidate['seasonal_order']
+    return p + q + P + Q + (candidate['trend'] not in (None, 'n'))
+
+
+def is_nested(small: dict, large: dict) -> bool:
+    """
+    Whether small is a special case of large, so its fitted parameters are a
+    reasonable starting point for fitting large.
+    """
+    p, d, q = small['order']
+    P, D, Q, s = small['seasonal_order']
+    p2, d2, q2 = large['order']
+    P2, D2, Q2, s2 = large['seasonal_order']
+    same_season = s == s2 or (P, D, Q) == (0, 0, 0)
+    return d == d2 and D == D2 and same_season and p <= p2 and q <= q2 and P <= P2 and Q <= Q2
+
+
+def search_fingerprint(y: pd.Series, exog: pd.DataFrame, steps: int, initial_train_size: int, maxiter: int) -> str:
+    """
+    Returns a hash of the data and settings a candidate's score depends on, so
+    that results stored for other data or settings are not reused.
+    """
+    h = hashlib.sha256()
+    h.update(pd.util.hash_pandas_object(y).to_numpy().tobytes())
+    if exog is not None:
+        h.update(pd.util.hash_pandas_object(exog).to_numpy().tobytes())
+        h.update(repr(list(exog.columns)).encode())
+    h.update(repr((steps, initial_train_size, maxiter)).encode())
+    return h.hexdigest()[:16]
+
+
+def load_results(results_file: str, fingerprint: str = None) -> dict:
+    """
+    Reads the results store, a JSON-lines file with one finished candidate per line.
+
+    Parameters:
+        results_file (str): The results store, or None.
+        fingerprint (str): Keep only records with this search_fingerprint. Default is None (keep all).
+
+    Returns:
+        dict: Candidate key to its result record.
+    """
+    results = {}
+    if results_file is not None and path.isfile(results_file):
+        with open(results_file) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if fingerprint is None or record.get('fingerprint') == fingerprint:
+                        results[candidate_key(record)] = record
+    return results
+
+
+def append_result(results_file: str, record: dict):
+    """
+    Appends one finished candidate to the results store.
+    """
+    if results_file is None:
+        return
+    with open(results_file, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+        f.flush()
+
+
+def evaluate_candidate(
+                    candidate: dict,
+                    y: pd.Series,
+                    exog: pd.DataFrame,
+                    initial_train_size: int,
+                    steps: int,
+                    maxiter: int,
+                    start_params: dict = None,
+                    benchmark: list = None,
+                    min_folds: int = 10,
+                    prune_ratio: float = 1.5
+                    ) -> dict:
+    """
+    Fits one SARIMAX candidate on the training window and scores it on the
+    validation window without refitting.
+
+    After the fit, validation proceeds fold by fold: the model forecasts `steps`
+    weeks ahead, then its Kalman filter is extended with the fold's observations
+    using the fitted parameters. Once min_folds folds are scored, the candidate
+    is pruned if its running MAE exceeds prune_ratio times the benchmark's
+    running MAE at the same fold.
+
+    Parameters:
+        candidate (dict): 'order', 'seasonal_order' and 'trend'.
+        y (pd.Series): Target series already transformed (e.g. log1p), covering train and validation.
+        exog (pd.DataFrame): Exogenous variables aligned with y, or None.
+        initial_train_size (int): Number of observations in the training window.
+        steps (int): Forecast horizon of each fold.
+        maxiter (int): Maximum optimizer iterations.
+        start_params (dict): Parameter name to starting value, from a nested fitted candidate. Default is None.
+        benchmark (list): Running MAE by fold of the current best candidate. Default is None (no pruning).
+        min_folds (int): Folds to score before pruning is considered. Default is 10.
+        prune_ratio (float): How much worse than the benchmark a candidate may be. Default is 1.5.
+
+    Returns:
+        dict: The candidate with 'status' ('done', 'pruned' or 'failed'), 'mae',
+        'fold_mae' (running MAE by fold), the fitted 'params' and, for failed
+        candidates, the 'error' that stopped the fit or the validation.
+    """
+    record = {**candidate, 'status': 'failed', 'mae': None, 'fold_mae': [], 'params': {}, 'error': None}
+    train_exog = None if exog is None else exog.iloc[:initial_train_size]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            model = SARIMAX(y.iloc[:initial_train_size], exog=train_exog,
+                            order=candidate['order'], seasonal_order=candidate['seasonal_order'],
+                            trend=candidate['trend'])
+            initial = None
+            if start_params:
+                initial = pd.Series(model.start_params, index=model.param_names)
+                shared = initial.index.intersection(list(start_params))
+                initial[shared] = [start_params[name] for name in shared]
+                initial = initial.to_numpy()
+            res = model.fit(start_params=initial, maxiter=maxiter, disp=False)
+            if not np.isfinite(res.params).all():
+                raise ValueError('the fit did not converge to finite parameters')
+            record['params'] = dict(zip(res.model.param_names, map(float, res.params)))
+
+            errors = []
+            for start in range(initial_train_size, len(y), steps):
+                stop = min(start + steps, len(y))
+                fold_exog = None if exog is None else exog.iloc[start:stop]
+                pred = np.expm1(res.forecast(stop - start, exog=fold_exog))
+                errors.extend(np.abs(pred.to_numpy() - np.expm1(y.iloc[start:stop].to_numpy())))
+                record['fold_mae'].append(float(np.mean(errors)))
+                res = res.extend(y.iloc[start:stop], exog=fold_exog)
+
+                k = len(record['fold_mae'])
+                if benchmark and min_folds <= k <= len(benchmark) and \
+                        record['fold_mae'][-1] > prune_ratio * benchmark[k - 1]:
+                    record['status'] = 'pruned'
+                    return record
+        except Exception as e:                  # one bad candidate must not stop the search
+            record['error'] = f'{type(e).__name__}: {e}'
+            return record
+
+    record['status'], record['mae'] = 'done', record['fold_mae'][-1]
+    return record
+
+
+def tune_sarimax(
+                y: pd.Series,
+                param_grid: dict,
+                initial_train_size: int,
+                exog: pd.DataFrame = None,
+                steps: int = 2,
+                maxiter: int = 100,
+                results_file: str = 'sarimax_tuning_results.jsonl',
+                min_folds: int = 10,
+                prune_ratio: float = 1.5,
+                max_workers: int = None,
+                seed_size: int = 2
+                ) -> pd.DataFrame:
+    """
+    Grid search over SARIMAX orders, in parallel and resumable.
+
+    Candidates are scored like grid_search_sarimax with refit=False: fitted once
+    on the first initial_train_size weeks and evaluated on `steps`-week
+    forecasts over the rest of y. The target is modelled on the log1p scale and
+    scored on the original scale, as with the notebooks' transformer_y.
+
+    Each finished candidate is appended to results_file with a fingerprint of
+    y, exog, steps, initial_train_size and maxiter (see search_fingerprint).
+    Candidates already stored under the same fingerprint are skipped, so an
+    interrupted search resumes where it stopped, while a search on new data or
+    settings starts afresh in the same file. Fits start from the parameters of
+    the largest nested candidate already fitted, and candidates falling well
+    behind the current best are pruned early (see evaluate_candidate). Until a
+    candidate has been scored, only seed_size candidates run at once, so that
+    the rest of the grid starts with warm starts and a pruning benchmark.
+
+    Parameters:
+        y (pd.Series): Target series covering the training and validation windows.
+        param_grid (dict): Lists of 'order', 'seasonal_order' and 'trend' values.
+        initial_train_size (int): Number of observations in the training window.
+        exog (pd.DataFrame): Exogenous variables aligned with y. Default is None.
+        steps (int): Forecast horizon. Default is 2.
+        maxiter (int): Maximum optimizer iterations per fit. Default is 100.
+        results_file (str): JSON-lines results store, or None to keep results in memory only.
+            Default is 'sarimax_tuning_results.jsonl'.
+        min_folds (int): Folds scored before a candidate can be pruned. Default is 10.
+        prune_ratio (float): Prune when running MAE exceeds this multiple of the best's. Default is 1.5.
+        max_workers (int): Number of worker processes. Default is None (the CPU count).
+        seed_size (int): Candidates run at once before the first one is scored. Default is 2.
+
+    Returns:
+        pd.DataFrame: One row per candidate with its status and MAE, best first.
+    """
+    fingerprint = search_fingerprint(y, exog, steps, initial_train_size, maxiter)
+    y = np.log1p(y.astype(float))
+    results = load_results(results_file, fingerprint)
+    pending = sorted((c for c in ParameterGrid(param_grid) if candidate_key(c) not in results), key=complexity)
+
+    def best():
+        done = [r for r in results.values() if r['status'] == 'done']
+        return min(done, key=lambda r: r['mae']) if done else None
+
+    def warm_start(candidate):
+        nested = [r for r in results.values()
+                  if r['status'] != 'failed' and r['params'] and is_nested(r, candidate)]
+        return max(nested, key=complexity)['params'] if nested else None
+
+    max_workers = max_workers or cpu_count()
+    seed_size = seeds_left = min(seed_size, max_workers)
+    with ProcessPoolExecutor(max_workers) as pool:
+        running = set()
+        while pending or running:
+            width = max_workers if best() or seeds_left <= 0 else seed_size
+            while pending and len(running) < width:
+                candidate = pending.pop(0)
+                current = best()
+                running.add(pool.submit(evaluate_candidate, candidate, y, exog, initial_train_size,
+                                        steps, maxiter, warm_start(candidate),
+                                        current['fold_mae'] if current else None,
+                                        min_folds, prune_ratio))
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                record['order'], record['seasonal_order'] = list(record['order']), list(record['seasonal_order'])
+                record['fingerprint'] = fingerprint
+                seeds_left -= 1
+                results[candidate_key(record)] = record
+                append_result(results_file, record)
+
+    table = pd.DataFrame(list(results.values()))[['order', 'seasonal_order', 'trend', 'status', 'mae']]
+    return table.sort_values('mae', na_position='last').reset_index(drop=True)
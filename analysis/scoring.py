@@ -0,0 +1,231 @@
+import pandas as pd
+import numpy as np
+import sys
+from os import path
+from datetime import date
+
+sys.path.append(path.join(path.dirname(path.abspath(__file__)), '..', 'datasets'))
+from utils.epiweek_codes import fromdates, split
+
+
+def load_predictions(
+                    files: dict,
+                    start: date = None,
+                    end: date = None,
+                    columns: list = None
+                    ):
+    """
+    Loads many prediction CSVs into one aligned array.
+
+    Each file is a backtest output as saved in '02 Test Models', with the week
+    start dates in the first column. Weeks missing from a file are NaN.
+
+    Parameters:
+        files (dict): (model, horizon) to CSV path,
+            e.g. {('ElasticNet', 1): 'elasticnetbacktestingpreds1.csv'}.
+        start (date): First week to keep. Default is None (all weeks).
+        end (date): Last week to keep. Default is None (all weeks).
+        columns (list): Columns to load, e.g. quantile levels. Default is None ('pred' only).
+
+    Returns:
+        tuple: The predictions array of shape (models, weeks, horizons), or
+        (models, weeks, horizons, columns) when columns is given, followed by
+        the model names, the week index and the horizons.
+    """
+    frames = {key: pd.read_csv(f, index_col=0, parse_dates=True) for key, f in files.items()}
+    return align_predictions(frames, start, end, columns)
+
+
+def align_predictions(
+                    frames: dict,
+                    start: date = None,
+                    end: date = None,
+                    columns: list = None
+                    ):
+    """
+    Aligns prediction frames already in memory, e.g. the quantile tables of
+    probabilistic_forecasting.backtesting_quantiles, into one array.
+
+    Parameters:
+        frames (dict): (model, horizon) to a DataFrame indexed by week.
+        start (date): First week to keep. Default is None (all weeks).
+        end (date): Last week to keep. Default is None (all weeks).
+        columns (list): Columns to take. Default is None ('pred' only).
+
+    Returns:
+        tuple: As load_predictions.
+    """
+    models = list(dict.fromkeys(model for model, _ in frames))
+    horizons = sorted({horizon for _, horizon in frames})
+
+    weeks = pd.DatetimeIndex(sorted(set().union(*(frame.index for frame in frames.values()))))
+    weeks = weeks[(weeks >= pd.Timestamp(start or weeks.min())) & (weeks <= pd.Timestamp(end or weeks.max()))]
+
+    cols = ['pred'] if columns is None else [str(c) for c in columns]
+    preds = np.full((len(models), len(weeks), len(horizons), len(cols)), np.nan)
+    for (model, horizon), frame in frames.items():
+        frame = frame.set_axis(frame.columns.astype(str), axis=1)
+        preds[models.index(model), :, horizons.index(horizon)] = frame[cols].reindex(weeks).to_numpy()
+
+    return (preds[..., 0] if columns is None else preds), models, weeks, horizons
+
+
+def weekly_losses(
+                actual,
+                preds: np.ndarray = None,
+                quantiles: np.ndarray = None,
+                levels: list = None
+                ) -> dict:
+    """
+    Computes per-week losses for every model and horizon at once.
+
+    Parameters:
+        actual (array-like): Observed values per week, shape (weeks,).
+        preds (np.ndarray): Point predictions, shape (models, weeks, horizons). Default is None
+            (the median of quantiles is used).
+        quantiles (np.ndarray): Quantile predictions, shape (models, weeks, horizons, levels). Default is None.
+        levels (list): Quantile levels matching the last axis of quantiles, in increasing order.
+
+    Returns:
+        dict: Loss name to an array of shape (models, weeks, horizons). Always has
+        'ae', 'se' and 'ape'; with quantiles also 'wis' and one f'coverage_{level}'
+        per central interval level.
+    """
+    y = np.asarray(actual, dtype=float)[None, :, None]
+    if preds is None:
+        levels = np.asarray(levels, dtype=float)
+        preds = quantiles[..., np.argmin(np.abs(levels - 0.5))]
+    err = preds - y
+    losses = {
+        'ae': np.abs(err),
+        'se': err ** 2,
+        'ape': np.abs(err) / np.maximum(np.abs(y), np.finfo(float).eps),
+    }
+    if quantiles is not None:
+        levels = np.asarray(levels, dtype=float)
+        yq = y[..., None]
+        pinball = ((yq < quantiles) - levels) * (quantiles - yq)
+        losses['wis'] = 2 * pinball.mean(axis=-1)       # equals the interval-based WIS for symmetric level sets
+        for i in range(len(levels) // 2):
+            lower, upper = quantiles[..., i], quantiles[..., -1 - i]
+            covered = ((lower <= y) & (y <= upper)).astype(float)
+            covered[np.isnan(lower) | np.isnan(upper)] = np.nan
+            losses[f'coverage_{1 - 2 * levels[i]:.2f}'] = covered
+    return losses
+
+
+def summarize(losses: dict, models: list, horizons: list, mask: np.ndarray = None) -> pd.DataFrame:
+    """
+    Averages weekly losses over weeks into MAE, RMSE, MAPE, WIS and coverage.
+
+    Parameters:
+        losses (dict): Output of weekly_losses.
+        models (list): Model names.
+        horizons (list): Horizons.
+        mask (np.ndarray): Boolean array over weeks selecting the weeks to include. Default is None (all).
+
+    Returns:
+        pd.DataFrame: One row per (model, horizon).
+    """
+    sl = slice(None) if mask is None else mask
+    means = {name: np.nanmean(loss[:, sl], axis=1) for name, loss in losses.items()}
+    out = {'MAE': means['ae'], 'RMSE': np.sqrt(means['se']), 'MAPE': means['ape']}
+    if 'wis' in means:
+        out['WIS'] = means['wis']
+    out.update({name: value for name, value in means.items() if name.startswith('coverage_')})
+    index = pd.MultiIndex.from_product([models, horizons], names=['model', 'horizon'])
+    return pd.DataFrame({name: value.ravel() for name, value in out.items()}, index=index)
+
+
+def seasons(weeks: pd.DatetimeIndex) -> np.ndarray:
+    """
+    Labels each week with its influenza season, which runs from epiweek 40
+    through epiweek 39 of the following year, e.g. '2018/2019'.
+    """
+    year, week = split(fromdates(weeks))
+    first = np.where(week >= 40, year, year - 1)
+    return np.char.add(np.char.add(first.astype(str), '/'), (first + 1).astype(str))
+
+
+def score(
+        actual: pd.Series,
+        preds: np.ndarray,
+        models: list,
+        weeks: pd.DatetimeIndex,
+        horizons: list,
+        quantiles: np.ndarray = None,
+        levels: list = None,
+        by: str = None
+        ) -> pd.DataFrame:
+    """
+    Scores every model and horizon in one call.
+
+    Parameters:
+        actual (pd.Series): Observed values indexed by week start.
+        preds (np.ndarray): Point predictions from load_predictions, or None to use the quantile median.
+        models (list): Model names.
+        weeks (pd.DatetimeIndex): Week index of preds.
+        horizons (list): Horizons.
+        quantiles (np.ndarray): Quantile predictions of shape (models, weeks, horizons, levels). Default is None.
+        levels (list): Quantile levels of quantiles. Default is None.
+        by (str): None for one row per model and horizon, or 'season' to break down by influenza season.
+
+    Returns:
+        pd.DataFrame: MAE, RMSE, MAPE and, with quantiles, WIS and interval coverage.
+    """
+    losses = weekly_losses(actual.reindex(weeks).to_numpy(), preds, quantiles, levels)
+    if by is None:
+        return summarize(losses, models, horizons)
+    if by == 'season':
+        labels = seasons(weeks)
+        return pd.concat({season: summarize(losses, models, horizons, labels == season)
+                          for season in np.unique(labels)}, names=['season'])
+    raise ValueError("by must be None or 'season'")
+
+
+def rolling_score(
+                actual: pd.Series,
+                preds: np.ndarray,
+                models: list,
+                weeks: pd.DatetimeIndex,
+                horizons: list,
+                window: int,
+                quantiles: np.ndarray = None,
+                levels: list = None
+                ) -> pd.DataFrame:
+    """
+    Trailing-window MAE (and WIS, with quantiles) for every model and horizon,
+    computed from cumulative sums along the week axis.
+
+    Parameters:
+        actual (pd.Series): Observed values indexed by week start.
+        preds (np.ndarray): Point predictions from load_predictions, or None to use the quantile median.
+        models (list): Model names.
+        weeks (pd.DatetimeIndex): Week index of preds.
+        horizons (list): Horizons.
+        window (int): Window length in weeks.
+        quantiles (np.ndarray): Quantile predictions. Default is None.
+        levels (list): Quantile levels of quantiles. Default is None.
+
+    Returns:
+        pd.DataFrame: Indexed by week, with (metric, model, horizon) columns; NaN until a full window is available.
+    """
+    losses = weekly_losses(actual.reindex(weeks).to_numpy(), preds, quantiles, levels)
+    out = {}
+    for name in ['ae', 'wis']:
+        if name not in losses:
+            continue
+        loss = losses[name]
+        valid = ~np.isnan(loss)
+        csum = np.concatenate([np.zeros_like(loss[:, :1]), np.cumsum(np.where(valid, loss, 0), axis=1)], axis=1)
+        ccount = np.concatenate([np.zeros_like(loss[:, :1]), np.cumsum(valid, axis=1)], axis=1)
+        total = csum[:, window:] - csum[:, :-window]
+        count = ccount[:, window:] - ccount[:, :-window]
+        rolled = np.full_like(loss, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rolled[:, window - 1:] = total / count
+        out['MAE' if name == 'ae' else 'WIS'] = rolled
+
+    columns = pd.MultiIndex.from_product([list(out), models, horizons], names=['metric', 'model', 'horizon'])
+    values = np.concatenate([v.transpose(1, 0, 2).reshape(len(weeks), -1) for v in out.values()], axis=1)
+    return pd.DataFrame(values, index=weeks, columns=columns)
@@ -0,0 +1,221 @@
+import pandas as pd
+import numpy as np
+import hashlib, inspect, json
+from datetime import date
+from os import path, makedirs, stat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from utils.make_google_trends_dataset import make_google_trends_dataset
+from utils.make_weather_dataset import make_weather_dataset
+from utils.surveillance_datasets import make_incidence_dataset, make_syndromic_dataset, incidence_files, msss_file
+from utils.get_aqi_dataset import get_aqi_dataset, aqi_files
+from utils.epiweek_codes import startdates
+from utils.instrumentation import instrumented
+
+# Sources in the order they are joined into raw_dataset.csv. Network-bound
+# sources run on threads, CPU-bound file parsing runs on processes.
+SOURCES = {
+    'google_trends': (make_google_trends_dataset, 'thread'),
+    'weather': (make_weather_dataset, 'thread'),
+    'incidence': (make_incidence_dataset, 'process'),
+    'syndromic': (make_syndromic_dataset, 'process'),
+    'aqi': (get_aqi_dataset, 'process'),
+}
+
+# Keyword arguments restricting each source to a date range, used by
+# refresh_raw_dataset. Sources without an entry are parsed in full and
+# trimmed afterwards.
+DATE_PARAMS = {
+    'google_trends': lambda start, end: {'iso_start_date': start.isoformat(),
+                                         'iso_end_date': end.isoformat()},
+    'weather': lambda start, end: {'start_date': start, 'end_date': end},
+    'aqi': lambda start, end: {'start_year': start.year, 'end_year': end.year},
+}
+
+# The files each file-based source reads, given its bound arguments. Their
+# defaults are only known once utils/secrets.ini is read, and the AQI files are
+# named by year, so cache_key resolves them here to fingerprint them.
+INPUT_FILES = {
+    'incidence': lambda args: incidence_files() if args['files'] is None else args['files'],
+    'syndromic': lambda args: msss_file() if args['syndromic_file'] is None else args['syndromic_file'],
+    'aqi': lambda args: aqi_files(args['start_year'], args['end_year']),
+}
+
+CACHE_PATH = 'data/cache'
+
+
+def fingerprint(value):
+    """
+    Makes a parameter value hashable for the cache key. Paths to existing files
+    are replaced by their path, size and modification time (not their contents,
+    which would mean reading every input on each build), so that a source is
+    rebuilt when its input files are rewritten.
+
+    Parameters:
+        value: A parameter value passed to a source function.
+
+    Returns:
+        A JSON-serialisable stand-in for the value.
+    """
+    if isinstance(value, (list, tuple)):
+        return [fingerprint(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): fingerprint(v) for k, v in sorted(value.items())}
+    if isinstance(value, str) and path.isfile(value):
+        st = stat(value)
+        return [value, st.st_size, st.st_mtime_ns]
+    return repr(value)
+
+
+def cache_key(name: str, params: dict = None) -> str:
+    """
+    Builds the hash identifying one source build.
+
+    The hash covers the source name, every argument of the source function,
+    defaults included, and the files it reads (see INPUT_FILES), after
+    fingerprint() has been applied to them.
+
+    Parameters:
+        name (str): The source name, a key of SOURCES.
+        params (dict): Keyword arguments for the source function. Default is None.
+
+    Returns:
+        str: A hex digest.
+    """
+    fn, _ = SOURCES[name]
+    bound = inspect.signature(fn).bind(**(params or {}))
+    bound.apply_defaults()
+    inputs = INPUT_FILES[name](bound.arguments) if name in INPUT_FILES else None
+    payload = json.dumps([name, fingerprint(dict(bound.arguments)), fingerprint(inputs)], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def cache_file(name: str, params: dict = None, cache_path: str = CACHE_PATH) -> str:
+    """
+    Returns the Parquet file a source build is cached in.
+    """
+    return path.join(cache_path, f'{name}-{cache_key(name, params)}.parquet')
+
+
+def to_cache(df: pd.DataFrame, file: str) -> None:
+    """
+    Writes a source frame to the Parquet cache.
+
+    Object columns can hold arrays where a weekly mode was tied; these are
+    stored as their string form, which is also how to_csv writes them.
+    """
+    df = df.copy()
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].map(lambda v: str(v) if np.ndim(v) else v)
+    makedirs(path.dirname(file), exist_ok=True)
+    df.to_parquet(file)
+
+
+def build_raw_dataset(
+                    params: dict = None,
+                    refresh: list = (),
+                    cache_path: str = CACHE_PATH,
+                    max_workers: int = None,
+                    out_file: str = None
+                    ) -> pd.DataFrame:
+    """
+    Builds the raw dataset by running every source concurrently and joining them.
+
+    Each source's epiweek-indexed frame is cached as Parquet under a hash of its
+    parameters and the size and modification time of its input files, so only
+    sources that changed are rebuilt.
+
+    Parameters:
+        params (dict): Source name to keyword arguments for its function,
+            e.g. {'syndromic': {'chunksize': 10**6}}. Default is None.
+        refresh (list): Source names to rebuild even if cached. Default is ().
+        cache_path (str): Directory holding the Parquet cache. Default is CACHE_PATH.
+        max_workers (int): Workers per pool. Default is None (the executors' default).
+        out_file (str): If given, the joined dataset is also written to this CSV file.
+
+    Returns:
+        pd.DataFrame: The inner join of all sources, indexed by epiweek.
+    """
+    params = params or {}
+    files = {name: cache_file(name, params.get(name), cache_path) for name in SOURCES}
+    stale = [name for name in SOURCES if name in refresh or not path.isfile(files[name])]
+
+    for name, df in run_sources(stale, params, max_workers).items():
+        to_cache(df, files[name])
+
+    dd = join_sources({name: pd.read_parquet(files[name]) for name in SOURCES})
+
+    if out_file is not None:
+        dd.to_csv(out_file)
+    return dd
+
+
+def run_sources(names: list, params: dict = None, max_workers: int = None) -> dict:
+    """
+    Runs the given sources concurrently, each on the pool kind listed in SOURCES.
+
+    Parameters:
+        names (list): Source names to run.
+        params (dict): Source name to keyword arguments for its function. Default is None.
+        max_workers (int): Workers per pool. Default is None (the executors' default).
+
+    Returns:
+        dict: Source name to the frame it returned.
+    """
+    params = params or {}
+    with ThreadPoolExecutor(max_workers) as threads, ProcessPoolExecutor(max_workers) as processes:
+        pools = {'thread': threads, 'process': processes}
+        futures = {name: pools[SOURCES[name][1]].submit(SOURCES[name][0], **params.get(name, {}))
+                   for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+
+@instrumented('join')
+def join_sources(frames: dict) -> pd.DataFrame:
+    """
+    Inner-joins source frames on epiweek in SOURCES order.
+    """
+    names = [name for name in SOURCES if name in frames]
+    dd = frames[names[0]]
+    for name in names[1:]:
+        dd = dd.join(frames[name], how='inner')
+    return dd
+
+
+def refresh_raw_dataset(
+                    file: str = 'data/raw_dataset.csv',
+                    end_date: date = None,
+                    params: dict = None,
+                    max_workers: int = None
+                    ) -> pd.DataFrame:
+    """
+    Appends new weeks to a stored raw dataset without rebuilding it.
+
+    The latest epiweek in the file is treated as possibly partial. Every source
+    is asked only for data from the start of that week onwards (see DATE_PARAMS),
+    and the resulting rows replace or extend the stored ones by epiweek.
+
+    Parameters:
+        file (str): The stored raw dataset CSV, updated in place. Default is 'data/raw_dataset.csv'.
+        end_date (datetime.date): Last date to request. Default is None (today).
+        params (dict): Extra keyword arguments per source, applied over the date range. Default is None.
+        max_workers (int): Workers per pool. Default is None (the executors' default).
+
+    Returns:
+        pd.DataFrame: The updated dataset, indexed by epiweek.
+    """
+    stored = pd.read_csv(file, index_col='epiweek')
+    last = stored.index.max()
+    start = pd.Timestamp(startdates([last])[0]).date()
+    end_date = end_date or date.today()
+
+    params = params or {}
+    params = {name: {**(DATE_PARAMS[name](start, end_date) if name in DATE_PARAMS else {}),
+                     **params.get(name, {})}
+              for name in SOURCES}
+    new = join_sources(run_sources(list(SOURCES), params, max_workers))
+    new = new.loc[new.index >= last].reindex(columns=stored.columns)      # columns with no data yet come through as NaN
+
+    dd = pd.concat([stored.drop(index=new.index, errors='ignore'), new]).sort_index()
+    dd.index.name = 'epiweek'
+    dd.to_csv(file)
+    return dd
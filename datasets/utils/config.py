@@ -0,0 +1,43 @@
+import configparser
+from functools import lru_cache
+
+# Secrets are read on first use rather than at import, so modules can be
+# imported (by workers, benchmarks or other tools) without a secrets file.
+SECRETS_FILE = 'utils/secrets.ini'
+
+
+@lru_cache(maxsize=None)
+def read_config(file: str = SECRETS_FILE) -> configparser.ConfigParser:
+    """
+    Reads a secrets file once per process.
+
+    Args:
+        file (str): Path of the INI file, relative to the working directory. Default is SECRETS_FILE.
+
+    Returns:
+        configparser.ConfigParser: The parsed file; empty if the file does not exist.
+    """
+    cfg = configparser.ConfigParser()
+    cfg.read(file)
+    return cfg
+
+
+def setting(option: str, file: str = SECRETS_FILE, section: str = 'default') -> str:
+    """
+    Returns one value from a secrets file.
+
+    Args:
+        option (str): The option name, e.g. 'root' or 'ncdc_token'.
+        file (str): Path of the INI file. Default is SECRETS_FILE.
+        section (str): The section holding the option. Default is 'default'.
+
+    Returns:
+        str: The option's value.
+
+    Raises:
+        KeyError: If the file, the section or the option is missing.
+    """
+    cfg = read_config(file)
+    if not cfg.has_option(section, option):
+        raise KeyError(f"'{option}' is not set in section [{section}] of {file}")
+    return cfg.get(section, option)
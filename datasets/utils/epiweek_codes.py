@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from utils.instrumentation import instrumented
+
+# Epiweeks are encoded as integers YYYYWW, the same form str(Week) takes
+# and the form the epiweek column is written to raw_dataset.csv in.
+MIN_YEAR, MAX_YEAR = 1, 9998
+
+
+@lru_cache(maxsize=None)
+def year_start_table() -> np.ndarray:
+    """
+    Builds the lookup table of CDC (MMWR) week-one start dates.
+
+    Week one of a year is the first Sunday-to-Saturday week containing at least
+    four days of that year, so it starts on the Sunday on or before January 1st
+    when January 1st falls on Sunday to Wednesday, and on the following Sunday
+    otherwise. The table is built once and cached.
+
+    Returns:
+        np.ndarray: datetime64[D] start dates indexed by (year - MIN_YEAR),
+        covering MIN_YEAR through MAX_YEAR + 1.
+    """
+    years = np.arange(MIN_YEAR, MAX_YEAR + 2)
+    jan1 = (years - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+    weekday = (jan1.astype(np.int64) + 4) % 7  # 1970-01-01 was a Thursday; Sunday = 0
+    offset = np.where(weekday <= 3, -weekday, 7 - weekday)
+    return jan1 + offset.astype('timedelta64[D]')
+
+
+def year_starts(years) -> np.ndarray:
+    """
+    Looks up the week-one start date of each year.
+
+    Args:
+        years (array-like): Integer years between MIN_YEAR and MAX_YEAR + 1.
+
+    Returns:
+        np.ndarray: datetime64[D] start dates.
+    """
+    years = np.asarray(years, dtype=np.int64)
+    if years.size and (years.min() < MIN_YEAR or years.max() > MAX_YEAR + 1):
+        raise ValueError(f'years must be between {MIN_YEAR} and {MAX_YEAR + 1}')
+    return year_start_table()[years - MIN_YEAR]
+
+
+def to_days(dates) -> np.ndarray:
+    """
+    Converts dates to datetime64[D].
+
+    datetime64 values, date and datetime objects and ISO strings are converted
+    by numpy, so every year from MIN_YEAR to MAX_YEAR is supported. Other
+    inputs (e.g. strings in other formats) go through pd.to_datetime and are
+    limited to the years datetime64[ns] can hold, 1677 to 2262.
+    """
+    values = np.asarray(dates)
+    if values.dtype.kind in 'MOUS':
+        try:
+            return values.astype('datetime64[D]')
+        except (ValueError, TypeError):
+            pass
+    return pd.to_datetime(values).values.astype('datetime64[D]')
+
+
+@instrumented('epiweek_mapping')
+def fromdates(dates) -> np.ndarray:
+    """
+    Converts dates to epiweek codes in bulk, matching Week.fromdate(x).
+
+    Args:
+        dates (array-like): Dates, datetimes, strings or datetime64 values (see to_days
+            for the years each kind supports).
+
+    Returns:
+        np.ndarray: int64 epiweek codes (YYYYWW).
+    """
+    days = to_days(dates)
+    years = days.astype('datetime64[Y]').astype(np.int64) + 1970
+    starts = year_starts(years)
+    years = years - (days < starts) + (days >= year_starts(years + 1))
+    weeks = (days - year_starts(years)).astype(np.int64) // 7 + 1
+    return years * 100 + weeks
+
+
+@instrumented('epiweek_parsing')
+def fromstrings(values) -> np.ndarray:
+    """
+    Parses epiweek strings or integers of the form YYYYWW in bulk, matching
+    Week.fromstring(str(x)).
+
+    Args:
+        values (array-like): Epiweeks as 'YYYYWW' strings or integers.
+
+    Returns:
+        np.ndarray: int64 epiweek codes (YYYYWW).
+    """
+    codes = pd.to_numeric(pd.Series(np.asarray(values)).astype(str)
+                          .str.replace(r'[-W]', '', regex=True),
+                          errors='raise').to_numpy(dtype=np.int64)
+    years, weeks = split(codes)
+    if (weeks < 1).any() or (weeks > nweeks(years)).any():
+        raise ValueError('Week number out of range for its year')
+    return codes
+
+
+def split(codes) -> tuple:
+    """
+    Splits epiweek codes into their year and week parts.
+
+    Args:
+        codes (array-like): Epiweek codes (YYYYWW).
+
+    Returns:
+        tuple: Two int64 arrays, years and week numbers.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    return codes // 100, codes % 100
+
+
+def nweeks(years) -> np.ndarray:
+    """
+    Returns the number of epiweeks (52 or 53) in each year.
+    """
+    years = np.asarray(years, dtype=np.int64)
+    return (year_starts(years + 1) - year_starts(years)).astype(np.int64) // 7
+
+
+def startdates(codes) -> np.ndarray:
+    """
+    Converts epiweek codes to the Sunday each week starts on, matching
+    Week.startdate().
+
+    Args:
+        codes (array-like): Epiweek codes (YYYYWW).
+
+    Returns:
+        np.ndarray: datetime64[D] week start dates.
+    """
+    years, weeks = split(codes)
+    return year_starts(years) + ((weeks - 1) * 7).astype('timedelta64[D]')
+
+
+def enddates(codes) -> np.ndarray:
+    """
+    Converts epiweek codes to the Saturday each week ends on, matching
+    Week.enddate().
+    """
+    return startdates(codes) + np.timedelta64(6, 'D')
@@ -0,0 +1,96 @@
+import json, hashlib, re, threading, time
+import requests
+from os import path, makedirs
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Shared by the API loaders (Google Trends, NCEI): requests are spread over a
+# thread pool, spaced out by one RateLimiter, and their JSON responses cached
+# on disk so that repeated builds do not hit the APIs again.
+
+
+class RateLimiter:
+    """
+    Spaces out request starts across threads so that no more than one request
+    begins every min_interval seconds.
+    """
+
+    def __init__(self, min_interval: float = 1.0):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_start = 0.0
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def make_session(pool_size: int = 8, retries: int = 5, backoff_factor: float = 1.0) -> requests.Session:
+    """
+    Builds a pooled requests session that retries throttled and failed calls
+    with exponential backoff.
+
+    Args:
+        pool_size (int): Number of pooled connections. Default is 8.
+        retries (int): Maximum number of retries per request. Default is 5.
+        backoff_factor (float): Backoff factor between retries, in seconds. Default is 1.0.
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=['GET'], respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def cache_file(url: str, cache_path: str) -> str:
+    """
+    Returns the file a response is cached in, keyed by the URL without its API key.
+    """
+    keyless = re.sub(r'&key=[^&]*', '', url)
+    return path.join(cache_path, hashlib.sha256(keyless.encode()).hexdigest() + '.json')
+
+
+def fetch_json(
+            url: str, 
+            session: requests.Session, 
+            limiter: RateLimiter = None, 
+            cache_path: str = None
+            ) -> dict:
+    """
+    Fetches one API response, reading it from and saving it to the on-disk
+    cache when cache_path is given.
+
+    Args:
+        url (str): The request URL.
+        session (requests.Session): The session to send the request with.
+        limiter (RateLimiter): Limiter to wait on before sending. Default is None.
+        cache_path (str): Directory of cached responses. Default is None (no caching).
+
+    Returns:
+        dict: The decoded JSON response.
+    """
+    if cache_path is not None:
+        file = cache_file(url, cache_path)
+        if path.isfile(file):
+            with open(file) as f:
+                return json.load(f)
+    if limiter is not None:
+        limiter.wait()
+    res = session.get(url)
+    res.raise_for_status()
+    contents = json.loads(res.content)
+    if cache_path is not None:
+        makedirs(cache_path, exist_ok=True)
+        with open(file, 'w') as f:
+            json.dump(contents, f)
+    return contents
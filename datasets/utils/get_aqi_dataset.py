@@ -1,16 +1,41 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from epiweeks import Week
+from utils.epiweek_codes import fromdates
+from utils.instrumentation import instrumented, stage
+from utils.config import setting
 from os import path
-import configparser
-cfg = configparser.ConfigParser()
-cfg.read('utils/secrets.ini')
 
-def get_aqi_dataset() -> pd.DataFrame:
+# Weekly aggregation applied to each daily column. 'mode' is computed by
+# weekly_mode; everything else is a built-in groupby reduction.
+AGGREGATIONS = {
+    'Overall AQI Value': 'mean',
+    'Main Pollutant': 'mode',
+    'CO': 'mean',
+    'Ozone': 'mean',
+    'PM10': 'mean',
+    'PM25': 'mean',
+    'Days Good': 'sum',
+    'Days Moderate': 'sum',
+    'Days Unhealthy': 'sum',
+}
+
+def aqi_files(start_year: int = 2005, end_year: int = 2019) -> list:
+    """
+    Paths of the aqidaily{year}.csv files of the given years, under the root set in utils/secrets.ini.
+    """
+    data_path = path.join(path.abspath(setting('root')), 'src/data')
+    return [path.join(data_path, f'aqidaily{year}.csv') for year in range(start_year, end_year+1)]
+
+@instrumented('aqi')
+def get_aqi_dataset(start_year: int = 2005, end_year: int = 2019) -> pd.DataFrame:
     """
     Retrieves the Air Quality Index (AQI) dataset.
 
+    Args:
+        start_year (int): First year of aqidaily{year}.csv files to read. Default is 2005.
+        end_year (int): Last year of aqidaily{year}.csv files to read. Default is 2019.
+
     Returns:
         pd.DataFrame: The AQI dataset containing the following columns:
             - epiweek: The epidemiological week.
@@ -24,23 +49,54 @@ def get_aqi_dataset() -> pd.DataFrame:
             - Days_Moderate: Number of days with moderate air quality.
             - Days_Unhealthy: Number of days with unhealthy air quality.
     """
-    ROOT_PATH = path.abspath(cfg.get('default','root'))
-    DATA_PATH = path.join(ROOT_PATH, 'src/data')
-    dd = pd.concat(
-        [pd.read_csv(path.join(DATA_PATH, f'aqidaily{year}.csv')) for year in range(2005,2020)])
+    with stage('aqi_read') as record:
+        dd = pd.concat([pd.read_csv(file) for file in aqi_files(start_year, end_year)])
+        record['rows_out'] = len(dd)
     dd = dd[['Date','Overall AQI Value','Main Pollutant','CO','Ozone','PM10','PM25']]
     for poll in ['CO','Ozone','PM10','PM25']:
         dd[poll] = pd.to_numeric(dd[poll], errors='coerce')
     dd['Date'] = pd.to_datetime(dd['Date'])
-    dd['epiweek'] = dd['Date'].map(lambda x: Week.fromdate(x))
+    dd['epiweek'] = fromdates(dd['Date'])
     dd = dd.set_index('epiweek').drop(columns=['Date'])
     dd['aqi'] = pd.cut(dd['Overall AQI Value'], 
                         bins=[0,50,100,200],
                         labels=['Good','Moderate','Unhealthy'])
     dd = pd.get_dummies(dd, columns=['aqi'], prefix=['Days '], prefix_sep=[''])
 
-    dd = dd.groupby('epiweek').aggregate(lambda x: 
-                                        x.mode() if x.dtype == 'O' 
-                                        else x.sum() if x.name[0:4] == 'Days'
-                                        else x.mean())
-    return dd.round()
\ No newline at end of file
+    reductions = {col: how for col, how in AGGREGATIONS.items() if how != 'mode'}
+    weekly = dd.groupby('epiweek').agg(reductions)
+    for col in [col for col, how in AGGREGATIONS.items() if how == 'mode']:
+        weekly[col] = weekly_mode(dd.index, dd[col])
+    return weekly[list(AGGREGATIONS)].round()
+
+
+def weekly_mode(keys, values) -> pd.Series:
+    """
+    Computes the most frequent value per key from categorical code counts.
+
+    Values are counted in a single bincount over (key, category code) pairs.
+    As with Series.mode(), a tie yields a sorted array of the tied values and
+    missing values are ignored.
+
+    Parameters:
+        keys (array-like): Group key of each value, e.g. the epiweek.
+        values (array-like): The values to take the mode of.
+
+    Returns:
+        pd.Series: The mode of each key, indexed by the sorted unique keys.
+    """
+    uniques, key_codes = np.unique(np.asarray(keys), return_inverse=True)
+    cat = pd.Categorical(values)
+    ncat = len(cat.categories)
+    valid = cat.codes >= 0
+    counts = np.bincount(key_codes[valid] * ncat + cat.codes[valid],
+                         minlength=len(uniques) * ncat).reshape(len(uniques), ncat)
+
+    top = counts.max(axis=1, initial=0)
+    tied = counts == top[:, None]
+    modes = np.empty(len(uniques), dtype=object)
+    single = tied.sum(axis=1) == 1
+    modes[single] = np.asarray(cat.categories, dtype=object)[counts[single].argmax(axis=1)]
+    for i in np.flatnonzero(~single):
+        modes[i] = np.asarray(cat.categories[tied[i]], dtype=object) if top[i] else np.nan
+    return pd.Series(modes, index=pd.Index(uniques, name='epiweek'))
\ No newline at end of file
@@ -0,0 +1,191 @@
+import json, os, sys, threading, time, functools
+from contextlib import contextmanager
+from datetime import datetime
+
+# Instrumentation is off unless a log file is configured. Settings live in the
+# environment so that worker processes started by build_raw_dataset and the
+# backtest pools inherit them.
+LOG_ENV = 'ILI_STAGE_LOG'
+PROFILE_ENV = 'ILI_PROFILE_STAGE'
+PROFILE_DIR_ENV = 'ILI_PROFILE_DIR'
+
+STATE = {
+    'log_file': os.environ.get(LOG_ENV) or None,
+    'profile_stage': os.environ.get(PROFILE_ENV) or None,
+    'profile_dir': os.environ.get(PROFILE_DIR_ENV) or '.',
+}
+LOCK = threading.Lock()
+
+
+def configure(log_file: str = None, profile_stage: str = None, profile_dir: str = '.') -> None:
+    """
+    Turns stage instrumentation on or off for this process and the processes it starts.
+
+    Args:
+        log_file (str): JSON-lines file stage records are appended to, or None to turn instrumentation off.
+        profile_stage (str): Name of one stage to run under cProfile. Default is None.
+        profile_dir (str): Directory for the .prof files of the profiled stage. Default is '.'.
+    """
+    settings = {LOG_ENV: log_file, PROFILE_ENV: profile_stage, PROFILE_DIR_ENV: profile_dir}
+    for key, value in settings.items():
+        if value is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = str(value)
+    STATE.update(log_file=log_file, profile_stage=profile_stage, profile_dir=profile_dir)
+
+
+def bytes_read() -> int:
+    """
+    Bytes this process has read through system calls so far (files and sockets),
+    or None where /proc/self/io is unavailable.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process so far, in MB, or None where unavailable.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def nrows(value):
+    """
+    Number of rows of a frame, series or array, or None for anything else.
+    """
+    shape = getattr(value, 'shape', None)
+    return int(shape[0]) if shape else None
+
+
+def write_record(record: dict) -> None:
+    line = json.dumps(record, default=str) + '\n'
+    with LOCK, open(STATE['log_file'], 'a') as f:
+        f.write(line)
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """
+    Measures a block of code as one named stage.
+
+    Yields a dict that the block may fill in, e.g. record['rows_in'] = len(df);
+    'rows_in', 'rows_out' and any extra keys are written with the record. When
+    instrumentation is off the block runs unmeasured.
+
+    Each record holds the stage name, start time, wall seconds, rows in and out,
+    bytes read by the process during the stage, the process's peak RSS at the
+    end of the stage and how much the stage raised it, the pid and thread, and
+    the status. Bytes read and peak RSS are per process, so stages running
+    concurrently on threads share them.
+
+    Args:
+        name (str): The stage name.
+        **fields: Extra values for the record, e.g. year=2010.
+    """
+    record = dict(fields)
+    if STATE['log_file'] is None:
+        yield record
+        return
+
+    profiler = None
+    if name == STATE['profile_stage']:
+        import cProfile
+        profiler = cProfile.Profile()
+
+    started = datetime.now().isoformat(timespec='milliseconds')
+    read_start, peak_start = bytes_read(), peak_rss_mb()
+    status, error = 'ok', None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield record
+    except BaseException as e:
+        status, error = 'error', f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        seconds = time.perf_counter() - start
+        read_end, peak_end = bytes_read(), peak_rss_mb()
+        if profiler is not None:
+            os.makedirs(STATE['profile_dir'], exist_ok=True)
+            record['profile'] = os.path.join(STATE['profile_dir'], f'{name}-{os.getpid()}-{time.time_ns()}.prof')
+            profiler.dump_stats(record['profile'])
+        write_record({
+            'stage': name,
+            'start': started,
+            'seconds': seconds,
+            'rows_in': record.pop('rows_in', None),
+            'rows_out': record.pop('rows_out', None),
+            'bytes_read': None if read_start is None else read_end - read_start,
+            'peak_rss_mb': peak_end,
+            'peak_rss_growth_mb': None if peak_start is None else peak_end - peak_start,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'status': status,
+            'error': error,
+            **record,
+        })
+
+
+def instrumented(name: str):
+    """
+    Decorator measuring every call of a function as a stage (see stage).
+
+    Rows in are taken from the first argument with a shape, rows out from the
+    return value. When instrumentation is off the only cost is one dictionary lookup.
+
+    Args:
+        name (str): The stage name.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if STATE['log_file'] is None:
+                return fn(*args, **kwargs)
+            with stage(name) as record:
+                record['rows_in'] = next((n for n in map(nrows, (*args, *kwargs.values())) if n is not None), None)
+                out = fn(*args, **kwargs)
+                record['rows_out'] = nrows(out)
+                return out
+        return wrapper
+    return decorate
+
+
+def read_log(file: str):
+    """
+    Reads a stage log into a DataFrame, one row per stage record.
+    """
+    import pandas as pd
+    with open(file) as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def summarize_log(file: str):
+    """
+    Totals a stage log by stage: calls, wall seconds, rows, bytes read and the highest peak RSS.
+    """
+    df = read_log(file)
+    columns = ['calls', 'seconds', 'rows_in', 'rows_out', 'bytes_read', 'peak_rss_mb']
+    if df.empty:                                # e.g. a benchmark stage that records no stages
+        return df.reindex(columns=columns).rename_axis('stage')
+    return df.groupby('stage').agg(calls=('seconds', 'size'),
+                                   seconds=('seconds', 'sum'),
+                                   rows_in=('rows_in', 'sum'),
+                                   rows_out=('rows_out', 'sum'),
+                                   bytes_read=('bytes_read', 'sum'),
+                                   peak_rss_mb=('peak_rss_mb', 'max'))\
+             .sort_values('seconds', ascending=False)
@@ -1,10 +1,11 @@
 import pandas as pd
-import json, math, requests, configparser
+import math
 from datetime import date
-from epiweeks import Week
-
-cfg = configparser.ConfigParser()
-secrets = cfg.read("utils/secrets.ini")
+from concurrent.futures import ThreadPoolExecutor
+from utils.epiweek_codes import fromdates
+from utils.fetch import RateLimiter, make_session, fetch_json
+from utils.instrumentation import instrumented
+from utils.config import setting
 
 def url_builder(
                 iso_start_date: str = '2004-01-01', 
@@ -14,7 +15,7 @@ def url_builder(
                 cat: str = '419', 
                 geo: str = 'US-MI-563', 
                 timeline_resolution: str = 'week', 
-                key: str = cfg.get("default", "gtrends_apikey")
+                key: str = None
                 ) -> str:
     """
     Builds a URL for querying Google Trends API with the specified parameters.
@@ -27,11 +28,12 @@ def url_builder(
         cat (str): The category ID for health-related topics. Default is '419'.
         geo (str): The geographic location for the query. Default is 'US-MI-563'.
         timeline_resolution (str): The resolution of the timeline data. Default is 'week'.
-        key (str): The API key for accessing the Google Trends API. Default is fetched from the configuration file.
+        key (str): The API key for accessing the Google Trends API. Default is None (read from utils/secrets.ini).
 
     Returns:
         str: The complete URL for querying the Google Trends API with the specified parameters.
     """
+    key = setting('gtrends_apikey') if key is None else key
     arguments = [
         discovery_url
         ,''.join([f'terms={t}&' for t in terms])
@@ -45,6 +47,7 @@ def url_builder(
     return f"{''.join([arg for arg in arguments])}"
 
 
+@instrumented('google_trends_fetch')
 def make_dataset(
                 iso_start_date: str = '2004-01-01', 
                 iso_end_date: str = '2019-12-31',
@@ -53,10 +56,16 @@ def make_dataset(
                 cat: str = '419', 
                 geo: str = 'US-MI-563', 
                 timeline_resolution: str = 'week', 
-                key: str = cfg.get("default", "gtrends_apikey")
+                key: str = None,
+                max_workers: int = 4,
+                min_interval: float = 1.0,
+                cache_path: str = 'data/cache/gtrends'
                 ) -> pd.DataFrame:
     """
     Fetches Google Trends data for specified terms and date range.
+
+    Requests are split into blocks of years so that no response exceeds the
+    API's 2000-point limit, and are sent concurrently over one pooled session.
     
     Args:
         iso_start_date (str): The start date in ISO format (YYYY-MM-DD). Default is '2004-01-01'.
@@ -64,42 +73,57 @@ def make_dataset(
         terms (list): The list of terms to fetch data for. Default is ['flu','fever','cough','cold'].
         discovery_url (str): The URL for Google Trends API. Default is 'https://www.googleapis.com/trends/v1beta/timelinesForHealth?'.
         cat (str): The category parameter for Google Trends API. Default is '419'.
-        geo (str): The geographic location parameter for Google Trends API. Default is 'US-MI-563'.
+        geo (str or list): The geographic location(s) for Google Trends API. Default is 'US-MI-563'.
         timeline_resolution (str): The resolution of the timeline data. Default is 'week'.
-        key (str): The API key for accessing Google Trends API. Default is fetched from configuration file.
+        key (str): The API key for accessing Google Trends API. Default is None (read from utils/secrets.ini).
+        max_workers (int): Number of concurrent requests. Default is 4.
+        min_interval (float): Minimum seconds between request starts, to stay within the rate limit. Default is 1.0.
+        cache_path (str): Directory for cached raw responses, or None to disable. Default is 'data/cache/gtrends'.
         
     Returns:
-        pd.DataFrame: The fetched Google Trends data as a pandas DataFrame.
+        pd.DataFrame: The fetched Google Trends data as a pandas DataFrame with
+        columns 'date', 'value', 'term' and 'geo'.
     """
-    
-    data = pd.DataFrame()
+    geos = [geo] if isinstance(geo, str) else list(geo)
+    key = setting('gtrends_apikey') if key is None else key
 
     start_year = date.fromisoformat(iso_start_date).year
     end_year = date.fromisoformat(iso_end_date).year
-    nyears = (end_year - start_year)
+    nyears = (end_year - start_year) + 1
     nterms = len(terms)
     ncalls = math.ceil((52 * nyears * nterms) / 2000)
     iter_years = math.ceil(nyears / ncalls)
 
-    for i in range(start_year, end_year+1, iter_years):
-        url = url_builder(f'{i}-01-01', f'{i + iter_years - 1}-12-31', terms)
-        res = requests.get(url)    
-        contents = json.loads(res.content)['lines']
-        for j in range(0,len(contents)):
-            df = pd.json_normalize(contents[j]['points'],meta=['value', 'date'])
-            df['term'] = contents[j]['term']
-            data = pd.concat([data, df])
-    return data
+    calls = []
+    for g in geos:
+        for i in range(start_year, end_year+1, iter_years):
+            block_start = max(f'{i}-01-01', iso_start_date)                 # ISO dates compare as strings;
+            block_end = min(f'{i + iter_years - 1}-12-31', iso_end_date)    # only the requested range is fetched
+            url = url_builder(block_start, block_end, terms, discovery_url, cat, g, timeline_resolution, key)
+            calls.append((g, url))
+
+    session = make_session(pool_size=max_workers)
+    limiter = RateLimiter(min_interval)
+    with ThreadPoolExecutor(max_workers) as pool:
+        responses = list(pool.map(lambda r: fetch_json(r[1], session, limiter, cache_path), calls))
+
+    records = [(point['date'], point['value'], line['term'], g)
+               for (g, _), contents in zip(calls, responses)
+               for line in contents['lines']
+               for point in line['points']]
+    return pd.DataFrame.from_records(records, columns=['date', 'value', 'term', 'geo'])
 
 
+@instrumented('google_trends_format')
 def format_dataset(df: pd.DataFrame) -> pd.DataFrame:
     """
     Formats the given DataFrame by performing the following operations:
     1. Converts the 'date' column to datetime format.
     2. Rounds the 'value' column to the nearest integer.
     3. Pivots the DataFrame using 'date' as the index, 'term' as the columns, and 'value' as the values.
+       When more than one geo was fetched, the columns are ('geo', 'term') pairs joined as 'geo_term'.
     4. Resets the column names and index.
-    5. Converts the 'date' column to epiweek format using the Week.fromdate() function.
+    5. Converts the 'date' column to epiweek codes (YYYYWW) using fromdates().
     6. Sets the 'epiweek' column as the new index and drops the 'date' column.
     7. Renames the columns by prefixing 'GS_' to each column name.
 
@@ -111,22 +135,34 @@ def format_dataset(df: pd.DataFrame) -> pd.DataFrame:
     """
     df['date'] = pd.to_datetime(df['date'])
     df['value'] = df['value'].apply(lambda x: round(x))
-    df = df.pivot_table(values='value', index='date', columns='term')
+    if 'geo' in df and df['geo'].nunique() > 1:
+        df = df.pivot_table(values='value', index='date', columns=['geo', 'term'])
+        df.columns = [f'{g}_{t}' for g, t in df.columns]
+    else:
+        df = df.pivot_table(values='value', index='date', columns='term')
     df.columns.name = None
     df = df.reset_index()
-    df['epiweek'] = df['date'].apply(lambda x: Week.fromdate(x))
+    df['epiweek'] = fromdates(df['date'])
     df = df.set_index('epiweek').drop(columns=['date'])
     df = df.rename(columns={c:f'GS_{c}' for c in df.columns})
     return df
 
 
-def make_google_trends_dataset() -> pd.DataFrame:
+@instrumented('google_trends')
+def make_google_trends_dataset(
+                            iso_start_date: str = '2004-01-01', 
+                            iso_end_date: str = '2019-12-31'
+                            ) -> pd.DataFrame:
     """
     Creates a Google Trends dataset by making use of the `make_dataset` and `format_dataset` functions.
 
+    Args:
+        iso_start_date (str): The start date in ISO format (YYYY-MM-DD). Default is '2004-01-01'.
+        iso_end_date (str): The end date in ISO format (YYYY-MM-DD). Default is '2019-12-31'.
+
     Returns:
         pd.DataFrame: The formatted Google Trends dataset.
     """
-    df = make_dataset()
+    df = make_dataset(iso_start_date, iso_end_date)
     return format_dataset(df)
 
@@ -1,13 +1,76 @@
-from pyncei import NCEIBot, NCEIResponse
-from datetime import date
-import configparser
+from datetime import date, timedelta
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
-from epiweeks import Week
+import requests
+from utils.epiweek_codes import fromdates
+from utils.fetch import RateLimiter, make_session, fetch_json
+from utils.instrumentation import instrumented, stage
+from utils.config import setting
 
-config = configparser.ConfigParser()
-secrets = config.read('utils/secrets.ini')
-my_token = config.get('default','ncdc_token')
-ncei = NCEIBot(my_token, cache_name='ncei_cache', expire_after=3600)
+# NCEI Climate Data Online web services. The API allows 5 requests a second and
+# 10,000 a day per token, returns at most 1000 results per page, and serves
+# daily (GHCND) data at most one year per request.
+NCEI_URL = 'https://www.ncei.noaa.gov/cdo-web/api/v2/'
+PAGE_SIZE = 1000
+
+# Recent days are revised as station reports arrive, so requests ending within
+# this many days of today bypass the response cache.
+SETTLED_DAYS = 30
+
+def ncei_url(endpoint: str, params: dict, base_url: str = NCEI_URL) -> str:
+    """
+    Builds a request URL. Colons are left unencoded, as the API rejects encoded ones.
+    """
+    return f'{base_url}{endpoint}?{urlencode(params, doseq=True, safe=":")}'
+
+def ncei_session(pool_size: int = 4, token: str = None) -> requests.Session:
+    """
+    Builds a pooled, retrying session (see make_session) carrying the API token.
+
+    Args:
+        pool_size (int): Number of pooled connections. Default is 4.
+        token (str): The NCEI token. Default is None (read from utils/secrets.ini).
+
+    Returns:
+        requests.Session: The configured session.
+    """
+    session = make_session(pool_size=pool_size)
+    session.headers['token'] = setting('ncdc_token') if token is None else token
+    return session
+
+def fetch_pages(
+                endpoint: str,
+                params: dict,
+                session: requests.Session,
+                limiter: RateLimiter = None,
+                cache_path: str = None,
+                base_url: str = NCEI_URL
+                ) -> list:
+    """
+    Fetches every result of one query, following the API's offset pagination.
+    Each page goes through fetch_json, so pages are rate limited and cached one by one.
+
+    Returns:
+        list: The result dicts of all pages.
+    """
+    results, offset = [], 1
+    while True:
+        url = ncei_url(endpoint, {**params, 'limit': PAGE_SIZE, 'offset': offset}, base_url)
+        contents = fetch_json(url, session, limiter, cache_path)
+        results.extend(contents.get('results', []))          # queries without data return {}
+        count = contents.get('metadata', {}).get('resultset', {}).get('count', 0)
+        offset += PAGE_SIZE
+        if offset > count:
+            return results
+
+def year_chunks(start_date: date, end_date: date) -> list:
+    """
+    Splits a date range into (start, end) pairs that do not cross a year boundary.
+    """
+    return [(max(date(year,1,1), start_date), min(date(year,12,31), end_date))
+            for year in range(start_date.year, end_date.year+1)]
 
 def get_ncei_dataset(
                     dataset_id='GHCND'
@@ -15,35 +78,112 @@ def get_ncei_dataset(
                     ,datatype_ids=['TMIN','TMAX','TAVG','PRCP','AWND','SNOW']
                     ,start_date=date(2004,1,1)
                     ,end_date=date(2019,12,31)
+                    ,max_workers: int = 4
+                    ,min_interval: float = 0.25
+                    ,cache_path: str = 'data/cache/ncei'
+                    ,base_url: str = NCEI_URL
+                    ,token: str = None
                     ) -> pd.DataFrame:
     """
-    Retrieves weather data from the NCEI dataset for a specific station and time period.
-    
+    Retrieves weather data from the NCEI dataset for one or more stations and a time period.
+
+    The range is requested in (station, year) chunks, fetched concurrently over
+    one pooled session. All threads share one RateLimiter, so the request rate
+    stays within the API's limit however many stations are asked for, and one
+    on-disk response cache, so rebuilding fetches only chunks that were not
+    fetched before or end within SETTLED_DAYS of today.
+
     Args:
         dataset_id (str): The ID of the dataset to retrieve. Default is 'GHCND'.
-        station_id (str): The ID of the weather station to retrieve data from. Default is 'GHCND:USW00094860'.
+        station_id (str or list): The ID(s) of the weather station(s) to retrieve data from. Default is 'GHCND:USW00094860'.
         datatype_ids (list): A list of datatype IDs to retrieve. Default is ['TMIN','TMAX','TAVG','PRCP','AWND','SNOW'].
         start_date (datetime.date): The start date of the data to retrieve. Default is January 1, 2004.
         end_date (datetime.date): The end date of the data to retrieve. Default is December 31, 2019.
-    
+        max_workers (int): Number of concurrent requests. Default is 4.
+        min_interval (float): Minimum seconds between request starts across all threads. Default is 0.25, a margin under 5 a second.
+        cache_path (str): Directory for cached raw responses, or None to disable. Default is 'data/cache/ncei'.
+        base_url (str): Root of the API. Default is NCEI_URL.
+        token (str): The NCEI token. Default is None (read from utils/secrets.ini).
+
     Returns:
-        pandas.DataFrame: A DataFrame containing the retrieved weather data.
-    """
-    
-    res = NCEIResponse()
-    for year in range(start_date.year,end_date.year+1):
-        res.extend(
-            ncei.get_data(
-                datasetid = dataset_id,
-                stationid = station_id,
-                datatypeid = datatype_ids,
-                startdate = date(year,1,1),
-                enddate = date(year,12,31),
-                units='standard'
-            )
-        )
-    return res.to_dataframe()
+        pandas.DataFrame: A DataFrame containing the retrieved weather data, with
+        columns 'date', 'datatype', 'station', 'attributes' and 'value'.
+    """
+    stations = [station_id] if isinstance(station_id, str) else list(station_id)
+    chunks = [(station, start, end) for station in stations for start, end in year_chunks(start_date, end_date)]
+    settled = date.today() - timedelta(days=SETTLED_DAYS)
+    session = ncei_session(max_workers, token)
+    limiter = RateLimiter(min_interval)
+
+    def fetch(chunk):
+        station, start, end = chunk
+        params = {'datasetid': dataset_id, 'stationid': station, 'datatypeid': list(datatype_ids),
+                  'startdate': start.isoformat(), 'enddate': end.isoformat(), 'units': 'standard'}
+        with stage('ncei_fetch', station=station, year=start.year) as record:
+            results = fetch_pages('data', params, session, limiter,
+                                  cache_path if end < settled else None, base_url)
+            record['rows_out'] = len(results)
+        return results
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        results = [r for chunk in pool.map(fetch, chunks) for r in chunk]
+    df = pd.DataFrame.from_records(results, columns=['date','datatype','station','attributes','value'])
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%dT%H:%M:%S')
+    return df
 
+def find_county_stations(
+                        counties: list
+                        ,dataset_id='GHCND'
+                        ,datatype_ids: list = None
+                        ,start_date=date(2004,1,1)
+                        ,end_date=date(2019,12,31)
+                        ,min_coverage: float = 0.9
+                        ,max_workers: int = 4
+                        ,min_interval: float = 0.25
+                        ,cache_path: str = 'data/cache/ncei'
+                        ,base_url: str = NCEI_URL
+                        ,token: str = None
+                        ) -> pd.DataFrame:
+    """
+    Lists the stations of a dataset inside each county, weighted equally within a county.
+
+    Args:
+        counties (list): County FIPS codes, e.g. ['26081'] for Kent County, MI.
+        dataset_id (str): The dataset the stations must report to. Default is 'GHCND'.
+        datatype_ids (list): Datatypes the stations must report. Default is None (any).
+        start_date (datetime.date): Stations must have data on or after this date. Default is January 1, 2004.
+        end_date (datetime.date): Stations must have data on or before this date. Default is December 31, 2019.
+        min_coverage (float): Smallest fraction of days with data for a station to be kept. Default is 0.9.
+        max_workers, min_interval, cache_path, base_url, token: As for get_ncei_dataset.
+
+    Returns:
+        pandas.DataFrame: One row per station and county with columns 'station',
+        'county', 'weight', 'name', 'latitude', 'longitude' and 'datacoverage',
+        ready to pass to county_weather. Replace 'weight' (e.g. with area
+        shares) to weight stations unequally.
+    """
+    settled = date.today() - timedelta(days=SETTLED_DAYS)
+    session = ncei_session(max_workers, token)
+    limiter = RateLimiter(min_interval)
+
+    def fetch(county):
+        params = {'datasetid': dataset_id, 'locationid': f'FIPS:{county}',
+                  'startdate': start_date.isoformat(), 'enddate': end_date.isoformat()}
+        if datatype_ids:
+            params['datatypeid'] = list(datatype_ids)
+        results = fetch_pages('stations', params, session, limiter,
+                              cache_path if end_date < settled else None, base_url)
+        return [{**r, 'county': county} for r in results]
+
+    with ThreadPoolExecutor(max_workers) as pool:
+        results = [r for county in pool.map(fetch, counties) for r in county]
+    df = pd.DataFrame.from_records(results, columns=['id','county','name','latitude','longitude','datacoverage'])\
+           .rename(columns={'id': 'station'})
+    df = df.loc[df['datacoverage'] >= min_coverage].reset_index(drop=True)
+    df.insert(2, 'weight', 1.0)
+    return df
+
+@instrumented('weather_format')
 def format_dataset(df, term):
     """
     Formats the dataset by converting the 'date' column to datetime,
@@ -62,16 +202,90 @@ def format_dataset(df, term):
     df = df.pivot_table(values='value', index='date', columns=term)
     df.columns.name = None
     df = df.reset_index()
-    df['epiweek'] = df['date'].apply(lambda x: Week.fromdate(x))
+    df['epiweek'] = fromdates(df['date'])
     df = df.set_index('epiweek').drop(columns=['date'])
     return df
 
-def make_weather_dataset():
+@instrumented('weather_county')
+def county_weather(df: pd.DataFrame, stations) -> pd.DataFrame:
+    """
+    Averages station data into one weekly series per county and datatype.
+
+    Daily values are first averaged per station and epiweek. Each county's value
+    is then the weighted mean of its stations' weekly values, with the weights
+    renormalised over the stations that reported that datatype that week, so a
+    station with gaps does not pull the average towards zero. Both steps are
+    done for all stations, datatypes and counties at once: one pivot to a
+    (week, datatype, station) array, and one product with the (station, county)
+    weight matrix.
+
+    Args:
+        df (pandas.DataFrame): Long station data with 'date', 'datatype', 'station'
+            and 'value', as returned by get_ncei_dataset.
+        stations (pandas.DataFrame or list of dict): 'station', 'county' and 'weight'
+            of every station in a county, as returned by find_county_stations. A
+            station may appear under several counties.
+
+    Returns:
+        pandas.DataFrame: Weekly values indexed by epiweek. Columns are the datatypes
+        for a single county and 'county_datatype' pairs for several.
+    """
+    weights = pd.DataFrame(stations).pivot_table(values='weight', index='station', columns='county',
+                                                 aggfunc='sum', fill_value=0)
+    df = df.loc[df['station'].isin(weights.index)]
+    weekly = df.assign(epiweek=fromdates(df['date']))\
+               .pivot_table(values='value', index='epiweek', columns=['datatype','station'], aggfunc='mean')
+    datatypes = weekly.columns.unique('datatype')
+    columns = pd.MultiIndex.from_product([datatypes, weights.index])
+    values = weekly.reindex(columns=columns).to_numpy()\
+                   .reshape(len(weekly), len(datatypes), len(weights.index))
+
+    present = ~np.isnan(values)
+    w = weights.to_numpy(dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        county = np.einsum('tds,sc->tcd', np.where(present, values, 0), w)\
+                 / np.einsum('tds,sc->tcd', present.astype(float), w)
+
+    if len(weights.columns) == 1:
+        names = list(datatypes)
+    else:
+        names = [f'{c}_{d}' for c in weights.columns for d in datatypes]
+    return pd.DataFrame(county.reshape(len(weekly), -1), index=weekly.index, columns=names)
+
+@instrumented('weather')
+def make_weather_dataset(
+                        start_date=date(2004,1,1)
+                        ,end_date=date(2019,12,31)
+                        ,counties: list = None
+                        ,stations = None
+                        ,max_workers: int = 4
+                        ):
     """
     Creates a weather dataset by extracting relevant columns from the NCEI dataset.
 
+    By default this is the daily data of one airport station (see get_ncei_dataset).
+    With counties or stations, every station is fetched concurrently and the data
+    is averaged into weekly county series (see county_weather).
+
+    Args:
+        start_date (datetime.date): The start date of the data to retrieve. Default is January 1, 2004.
+        end_date (datetime.date): The end date of the data to retrieve. Default is December 31, 2019.
+        counties (list): County FIPS codes whose stations are found with find_county_stations. Default is None.
+        stations (pandas.DataFrame or list of dict): Stations with 'station', 'county' and 'weight',
+            used instead of looking them up. Default is None.
+        max_workers (int): Number of concurrent requests. Default is 4.
+
     Returns:
         pandas.DataFrame: The formatted weather dataset.
     """
-    df = get_ncei_dataset()[['date','datatype','value']]
-    return format_dataset(df,'datatype')
+    if counties is None and stations is None:
+        df = get_ncei_dataset(start_date=start_date, end_date=end_date,
+                              max_workers=max_workers)[['date','datatype','value']]
+        return format_dataset(df,'datatype')
+    if stations is None:
+        stations = find_county_stations(counties, start_date=start_date, end_date=end_date,
+                                        max_workers=max_workers)
+    stations = pd.DataFrame(stations)
+    df = get_ncei_dataset(station_id=list(stations['station'].unique()), start_date=start_date,
+                          end_date=end_date, max_workers=max_workers)
+    return county_weather(df, stations)
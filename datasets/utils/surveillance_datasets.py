@@ -1,12 +1,13 @@
 import pandas as pd
+import numpy as np
+import csv, io, re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from datetime import datetime
-from epiweeks import Week
+from utils.epiweek_codes import fromdates, fromstrings
+from utils.instrumentation import instrumented, stage
+from utils.config import setting
 from os import path
-import configparser
-cfg = configparser.ConfigParser()
-cfg.read('utils/secrets.ini')
-ROOT_PATH = path.abspath(cfg.get('default','root'))
-DATA_PATH = path.join(ROOT_PATH, 'src/data')
 
 NAMES = [
         "cases 2000 to 2004.csv",
@@ -16,49 +17,251 @@ NAMES = [
         "cases 2019 to 2023.csv"
         ]
 
-FILES = [path.join(DATA_PATH, file_name) for file_name in NAMES]
+def data_path() -> str:
+    """
+    Directory of the source files, from the root set in utils/secrets.ini.
+    """
+    return path.join(path.abspath(setting('root')), 'src/data')
+
+def incidence_files() -> list:
+    """
+    Default incidence files: NAMES in data_path().
+    """
+    return [path.join(data_path(), file_name) for file_name in NAMES]
+
+def msss_file() -> str:
+    """
+    Default syndromic surveillance file: MSSS.csv in data_path().
+    """
+    return path.join(data_path(), 'MSSS.csv')
+
+def __getattr__(name):
+    # ROOT_PATH, DATA_PATH and FILES used to be read at import; they are still
+    # available as module attributes, resolved when first accessed.
+    if name == 'ROOT_PATH':
+        return path.abspath(setting('root'))
+    if name == 'DATA_PATH':
+        return data_path()
+    if name == 'FILES':
+        return incidence_files()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Layout of the MDSS exports: a preamble of PREAMBLE_LINES lines and a title
+# row, then a header of Region, County, one 'WW-YYYY' column per week and
+# Total, then one row per county.
+PREAMBLE_LINES = 6
+WEEK_LABEL = re.compile(r'^\d{1,2}-\d{4}$')
+
+def week_codes(labels) -> np.ndarray:
+    """
+    Converts MDSS week labels ('WW-YYYY') to epiweek codes (YYYYWW) in one vectorized pass.
+    """
+    labels = np.asarray(labels, dtype=str)
+    parts = np.char.partition(labels, '-').reshape(-1, 3)
+    return fromstrings(np.char.add(parts[:, 2], np.char.zfill(parts[:, 0], 2)))
+
+def read_incidence_file(file: str, counties: list = None) -> pd.DataFrame:
+    """
+    Reads the weekly case counts of one MDSS export.
+
+    Header and rows are split by the same csv rules (the csv reader to pick
+    the rows by their County field, then a quote-aware loadtxt or read_csv for
+    the counts), so quoted fields holding commas cannot shift the columns.
+    Only the rows of the requested counties are kept, and their counts are
+    converted to numbers in one call.
+
+    Parameters:
+        file (str): Path of the export.
+        counties (list): County names to keep. Default is None (every county).
+
+    Returns:
+        pd.DataFrame: Cases indexed by county, with one column per 'WW-YYYY' week label.
+    """
+    with stage('incidence_read', file=file) as record:
+        with open(file, newline='') as f:
+            lines = f.read().splitlines()[PREAMBLE_LINES:]
+        lines = [line for line in lines if line.strip()][1:]          # blank lines and the title row
+        rows = csv.reader(lines)                                    # one row per line, in step with lines
+        header = next(rows)
+        county_at = header.index('County')
+        wanted = None if counties is None else set(counties)
+        kept = [(line, row[county_at]) for line, row in zip(lines[1:], rows)
+                if len(row) > county_at and row[county_at] and (wanted is None or row[county_at] in wanted)]
+        record['rows_out'] = len(kept)
+
+    weeks = np.flatnonzero([bool(WEEK_LABEL.match(col)) for col in header])
+    rows = '\n'.join(line for line, _ in kept)
+    if not kept:
+        values = np.empty((0, len(weeks)))
+    else:
+        try:
+            values = np.loadtxt(io.StringIO(rows), delimiter=',', quotechar='"', usecols=weeks, ndmin=2)
+        except ValueError:                  # blank cells or thousands separators
+            values = pd.read_csv(io.StringIO(rows), header=None, usecols=weeks, thousands=',')[weeks].to_numpy(dtype=float)
+    return pd.DataFrame(values.reshape(len(kept), len(weeks)),
+                        index=pd.Index([name for _, name in kept], dtype=object, name='County'),
+                        columns=np.asarray(header, dtype=object)[weeks])
+
+def read_incidence_files(files: list = None, counties: list = None, max_workers: int = None) -> list:
+    """
+    Reads several MDSS exports with read_incidence_file, one file per process.
+
+    Parsing is CPU-bound and holds the GIL, so the files are spread over a
+    process pool, as build_raw_dataset does for its file-based sources. A
+    single file, or max_workers=1, is read in this process.
+
+    Returns:
+        list: One frame per file, in the order of files.
+    """
+    files = incidence_files() if files is None else files
+    read = partial(read_incidence_file, counties=counties)
+    if len(files) <= 1 or max_workers == 1:
+        return [read(f) for f in files]
+    with ProcessPoolExecutor(max_workers) as pool:
+        return list(pool.map(read, files))
+
+def long_incidence(frames: list) -> pd.DataFrame:
+    """
+    Stacks frames from read_incidence_file into one long table without concatenating frames.
+
+    The week labels of all frames are parsed together in one pass, and the
+    county, epiweek and cases columns are built as flat arrays, in frame order
+    and, within a frame, county by county.
+
+    Returns:
+        pd.DataFrame: Columns 'county', 'epiweek' and 'cases'.
+    """
+    codes = week_codes(np.concatenate([f.columns.to_numpy(dtype=str) for f in frames]))
+    codes = np.split(codes, np.cumsum([f.shape[1] for f in frames])[:-1])
+    cases = np.concatenate([f.to_numpy(dtype=float).ravel() for f in frames])
+    missing = np.isnan(cases)
+    return pd.DataFrame({
+        'county': np.concatenate([np.repeat(f.index.to_numpy(dtype=object), f.shape[1]) for f in frames]),
+        'epiweek': np.concatenate([np.tile(c, len(f)) for f, c in zip(frames, codes)]),
+        'cases': pd.arrays.IntegerArray(np.where(missing, 0, cases).astype(np.int64), missing),
+    })
 
-def make_incidence_dataset(files: list = FILES) -> pd.DataFrame:
+@instrumented('incidence')
+def make_incidence_dataset(files: list = None, max_workers: int = None) -> pd.DataFrame:
     """
     Create an incidence dataset by processing multiple files.
 
     Parameters:
-    - files (list): List of file paths to be processed (default: FILES)
+    - files (list): List of file paths to be processed (default: incidence_files())
+    - max_workers (int): Number of files read at once (default: None, the executor's default)
 
     Returns:
     - pd.DataFrame: Processed incidence dataset with columns 'epiweek' and 'cases'
     """
-    data = pd.DataFrame()
-    for f in files:
-        d = pd.read_csv(f, skiprows=6)
-        d.columns = d.iloc[0,] 
-        d = d.loc[d['County'] == 'Kent',]\
-                    .reset_index()\
-                    .drop(columns=['index','Region','County','Total']).T\
-                    .rename(columns={0:'cases'})
-        d.index.name = 'date'
-        data = pd.concat([d,data])
-    data = data.reset_index()
-    data['epiweek'] = data['date']\
-                        .apply(lambda x:
-                        Week.fromstring(
-                        f"{x.split('-')[1]}-{x.split('-')[0]}"))
-
-    return data.set_index('epiweek').drop(columns=['date'])
-
-def make_syndromic_dataset(syndromic_file = path.join(DATA_PATH, 'MSSS.csv')) -> pd.DataFrame:
+    frames = read_incidence_files(files, ['Kent'], max_workers)
+    data = long_incidence(frames[::-1])                      # latest file first, as before
+    return data.set_index('epiweek')[['cases']]
+
+@instrumented('incidence_counties')
+def make_county_incidence_dataset(files: list = None, counties: list = None, max_workers: int = None) -> pd.DataFrame:
+    """
+    Create a long incidence table for every county (or the given ones) at once.
+
+    The files are read concurrently and stacked with long_incidence. Where
+    files overlap, the week is taken from the later file, which includes late reports.
+
+    Parameters:
+        files (list): List of file paths to be processed, oldest first. Default is None (incidence_files()).
+        counties (list): County names to keep. Default is None (every county).
+        max_workers (int): Number of files read at once. Default is None (the executor's default).
+
+    Returns:
+        pd.DataFrame: Columns 'county', 'epiweek' and 'cases', sorted by county and epiweek.
+    """
+    data = long_incidence(read_incidence_files(files, counties, max_workers))
+    county = pd.factorize(data['county'], sort=True)[0].astype(np.int64)
+    key = county * 10**6 + data['epiweek'].to_numpy()                  # epiweek codes are below 10**6
+    # np.unique on the reversed keys finds each key's last occurrence and sorts by county, then epiweek
+    _, first = np.unique(key[::-1], return_index=True)
+    return data.take(len(key) - 1 - first).reset_index(drop=True)
+
+def make_syndromic_dataset(
+                        syndromic_file: str = None,
+                        chunksize: int = None,
+                        filters: dict = None
+                        ) -> pd.DataFrame:
     """
     Create a syndromic dataset from a CSV file.
+
+    With chunksize set, the file is scanned in chunks and only a per-week count
+    array is kept between chunks, so memory use does not grow with the size of
+    the file. The result is the same either way.
     
     Parameters:
-        syndromic_file (str): The path to the CSV file containing the syndromic data.
+        syndromic_file (str): The path to the CSV file containing the syndromic data. Default is msss_file().
+        chunksize (int): Number of rows to read per chunk. Default is None (read the whole file at once).
+        filters (dict): Column name to allowed values, applied to each chunk before counting,
+            e.g. {'County': ['Kent']}. Default is None (count every visit).
         
     Returns:
         pd.DataFrame: A DataFrame containing the syndromic dataset grouped by epiweek with the number of visits per week.
     """
-    df = pd.read_csv(syndromic_file, usecols=['Admitted'])
-    df['visits'], df['Admitted'] = 1, pd.to_datetime(df['Admitted'])
-    df['epiweek'] = df['Admitted'].apply(lambda x: Week.fromdate(x))
-    
-    return pd.DataFrame(df.groupby('epiweek')['visits'].sum())
+    syndromic_file = msss_file() if syndromic_file is None else syndromic_file
+    filters = filters or {}
+    with stage('syndromic', rows_in=0) as record:
+        reader = pd.read_csv(syndromic_file, usecols=['Admitted', *filters], chunksize=chunksize)
+        counts = WeeklyCounter()
+        for chunk in ([reader] if chunksize is None else reader):
+            record['rows_in'] += len(chunk)
+            for col, values in filters.items():
+                chunk = chunk.loc[chunk[col].isin(list(values))]
+            counts.add(pd.to_datetime(chunk['Admitted']))
+        visits = counts.to_frame('visits')
+        record['rows_out'] = len(visits)
+    return visits
+
+
+class WeeklyCounter:
+    """
+    Counts events per epiweek incrementally.
+
+    Each week is tracked by its position in the sequence of Sunday-starting
+    weeks, so counting a batch of dates is a single np.bincount and the
+    accumulator only ever holds one integer per week spanned by the data.
+    """
+
+    def __init__(self):
+        self.first = None
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, dates) -> None:
+        """
+        Adds one event for each date in dates.
+
+        Parameters:
+            dates (array-like): Event dates; missing dates are ignored.
+        """
+        days = pd.DatetimeIndex(dates).dropna().values.astype('datetime64[D]').astype(np.int64)
+        if days.size == 0:
+            return
+        weeks = (days + 4) // 7     # 1970-01-01 was a Thursday, so week 0 starts 1969-12-28
+        lo, hi = weeks.min(), weeks.max()
+        if self.first is None:
+            self.first = lo
+        if lo < self.first:
+            self.counts = np.concatenate([np.zeros(self.first - lo, dtype=np.int64), self.counts])
+            self.first = lo
+        if hi - self.first + 1 > self.counts.size:
+            self.counts = np.concatenate([self.counts,
+                                          np.zeros(hi - self.first + 1 - self.counts.size, dtype=np.int64)])
+        self.counts += np.bincount(weeks - self.first, minlength=self.counts.size)
+
+    def to_frame(self, name: str) -> pd.DataFrame:
+        """
+        Returns the counts of every week with at least one event, indexed by epiweek.
 
+        Parameters:
+            name (str): Name of the count column.
+        """
+        if self.first is None:                  # nothing counted, e.g. an empty file or unmatched filters
+            return pd.DataFrame({name: np.zeros(0, dtype=np.int64)},
+                                index=pd.Index(np.zeros(0, dtype=np.int64), name='epiweek'))
+        seen = np.flatnonzero(self.counts)
+        startdates = ((seen + self.first) * 7 - 4).astype('datetime64[D]')
+        index = pd.Index(fromdates(startdates), name='epiweek')
+        return pd.DataFrame({name: self.counts[seen]}, index=index)
@@ -0,0 +1,86 @@
+import json, sys, threading, time
+import pytest
+from os import path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# The loaders import their helpers as `utils.*` and the analysis modules import
+# `helper_functions`, as they do when run from their own directories.
+ROOT = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path[:0] = [path.join(ROOT, 'analysis'), path.join(ROOT, 'datasets')]
+
+
+class StubAPI:
+    """
+    A local HTTP server standing in for a JSON API.
+
+    respond(endpoint, query, attempt) returns (status, body) for each GET, where
+    query maps parameter names to lists of values and attempt counts earlier
+    requests for the same URL. Every request is recorded with its start and end
+    time and the number of requests in flight when it started.
+    """
+
+    def __init__(self, respond, latency: float = 0.0):
+        self.respond = respond
+        self.latency = latency
+        self.requests = []
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                with stub.lock:
+                    stub.in_flight += 1
+                    attempt = sum(r['path'] == self.path for r in stub.requests)
+                    record = {'path': self.path, 'start': time.monotonic(), 'in_flight': stub.in_flight,
+                              'headers': dict(self.headers)}
+                    stub.requests.append(record)
+                try:
+                    time.sleep(stub.latency)
+                    status, body = stub.respond(url.path.rsplit('/', 1)[-1], parse_qs(url.query), attempt)
+                    payload = json.dumps(body).encode()
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(payload)))
+                    if status == 429:
+                        self.send_header('Retry-After', '0')
+                    self.end_headers()
+                    self.wfile.write(payload)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+                        record['end'] = time.monotonic()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_api():
+    """
+    Starts StubAPI servers for a test and stops them afterwards.
+    """
+    servers = []
+
+    def start(respond, latency: float = 0.0) -> StubAPI:
+        server = StubAPI(respond, latency).__enter__()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.__exit__(None, None, None)
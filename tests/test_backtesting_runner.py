@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import Ridge
+from skforecast.ForecasterAutoreg import ForecasterAutoreg
+from skforecast.ForecasterSarimax import ForecasterSarimax
+from skforecast.Sarimax import Sarimax
+from skforecast.model_selection_sarimax import backtesting_sarimax
+from backtesting_runner import SHARED, BACKTEST_KWARGS, share_frame, init_worker, run_backtests, \
+    backtesting_sarimax_incremental
+
+
+@pytest.fixture(scope='module')
+def frame():
+    rng = np.random.default_rng(0)
+    n = 120
+    t = np.arange(n)
+    return pd.DataFrame({'cases': 50 + 20 * np.sin(2 * np.pi * t / 52) + rng.normal(0, 2, n),
+                         'TMAX': (50 - 20 * np.sin(2 * np.pi * t / 52)).astype(np.float32),
+                         'Days Unhealthy': (t % 3).astype(np.int8),
+                         'Main Pollutant_CO': t % 4 == 0},
+                        index=pd.date_range('2015-01-04', periods=n, freq='W'))
+
+
+def test_shared_frame_keeps_dtypes_and_shares_memory(frame):
+    shms, spec = share_frame(frame)
+    try:
+        assert sum(np.prod(b['shape']) * np.dtype(b['dtype']).itemsize for b in spec['blocks']) \
+               == frame.memory_usage(index=False).sum()
+        init_worker(spec)
+        df = SHARED['df']
+        pd.testing.assert_frame_equal(df[frame.columns], frame)
+        attached = [np.frombuffer(shm.buf, dtype=np.uint8) for shm in SHARED['shm']]
+        assert all(any(np.shares_memory(df[col].to_numpy(), buf) for buf in attached) for col in frame.columns)
+        del df, attached
+    finally:
+        SHARED.pop('df', None)
+        for shm in SHARED.pop('shm', []) + shms:
+            shm.close()
+        for shm in shms:
+            shm.unlink()
+
+
+def test_jobs_with_the_same_regressor_class_need_names(frame):
+    exog = ['TMAX', 'Days Unhealthy']
+    jobs = []
+    for alpha in (0.1, 10.0):
+        forecaster = ForecasterAutoreg(Ridge(alpha=alpha), lags=3)
+        forecaster.fit(frame['cases'].iloc[:80], exog=frame[exog].iloc[:80])
+        jobs.append(forecaster)
+
+    with pytest.raises(ValueError, match='distinct name'):
+        run_backtests([(jobs[0], 1), (jobs[1], 1)], frame, initial_train_size=80, max_workers=1)
+
+    table, preds = run_backtests([{'name': 'Ridge 0.1', 'forecaster': jobs[0], 'horizon': 1},
+                                  {'name': 'Ridge 10', 'forecaster': jobs[1], 'horizon': 1},
+                                  (jobs[0], 2)],
+                                 frame, initial_train_size=80, max_workers=2)
+    assert list(table['model']) == ['Ridge 0.1', 'Ridge 10', 'Ridge']
+    assert list(table['horizon']) == [1, 1, 2]
+    assert table['mae'].nunique() == 3
+
+
+@pytest.fixture
+def sarimax():
+    return ForecasterSarimax(regressor=Sarimax(order=(1, 0, 0), maxiter=200))
+
+
+def test_incremental_sarimax_refitting_every_fold_matches_full_refit(frame, sarimax):
+    y, exog = frame['cases'], frame[['TMAX']]
+    mae, preds = backtesting_sarimax_incremental(sarimax, y, initial_train_size=100, steps=4, exog=exog,
+                                                 reestimate_every=1, tolerance=1e-3)
+    _, full = backtesting_sarimax(forecaster=sarimax, y=y, exog=exog, steps=4, initial_train_size=100,
+                                  **{**BACKTEST_KWARGS, 'suppress_warnings_fit': True})
+    np.testing.assert_allclose(preds['pred'], full['pred'], rtol=1e-3)
+    assert mae == pytest.approx(np.mean(np.abs(full['pred'] - y.loc[full.index])), rel=1e-3)
+
+
+@pytest.mark.parametrize('reestimate_every', [0, -1, 1.5])
+def test_incremental_sarimax_rejects_bad_reestimate_every(frame, sarimax, reestimate_every):
+    with pytest.raises(ValueError, match='reestimate_every'):
+        backtesting_sarimax_incremental(sarimax, frame['cases'], initial_train_size=100, steps=4,
+                                        reestimate_every=reestimate_every)
@@ -0,0 +1,44 @@
+import os
+import pytest
+from utils.config import read_config
+from utils.build_raw_dataset import cache_key
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    """
+    A project root with a secrets file, source files and the working directory set to it.
+    """
+    (tmp_path / 'utils').mkdir()
+    (tmp_path / 'utils' / 'secrets.ini').write_text(f'[default]\nroot = {tmp_path}\n')
+    data = tmp_path / 'src' / 'data'
+    data.mkdir(parents=True)
+    for year in (2010, 2011):
+        (data / f'aqidaily{year}.csv').write_text('Date,Overall AQI Value\n')
+    (data / 'MSSS.csv').write_text('Admitted\n')
+    monkeypatch.chdir(tmp_path)
+    read_config.cache_clear()
+    yield data
+    read_config.cache_clear()
+
+
+def touch(file, seconds: int):
+    st = os.stat(file)
+    os.utime(file, ns=(st.st_atime_ns, st.st_mtime_ns + seconds * 10**9))
+
+
+@pytest.mark.parametrize('name, params, file', [
+    ('aqi', {'start_year': 2010, 'end_year': 2011}, 'aqidaily2010.csv'),
+    ('syndromic', {}, 'MSSS.csv'),
+])
+def test_cache_key_follows_default_input_files(root, name, params, file):
+    before = cache_key(name, params)
+    assert cache_key(name, params) == before
+    touch(root / file, 60)
+    assert cache_key(name, params) != before
+
+
+def test_aqi_cache_key_ignores_other_years(root):
+    before = cache_key('aqi', {'start_year': 2011, 'end_year': 2011})
+    touch(root / 'aqidaily2010.csv', 60)
+    assert cache_key('aqi', {'start_year': 2011, 'end_year': 2011}) == before
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import date, timedelta
+from epiweeks import Week, Year
+from utils.epiweek_codes import MIN_YEAR, MAX_YEAR, fromdates, fromstrings, startdates, enddates, nweeks, split
+
+
+def days(start: date, end: date) -> list:
+    return [start + timedelta(days=d) for d in range((end - start).days + 1)]
+
+
+# Every day of 1700-2300, which includes datetime64[ns]'s limits, and the edges of the supported years
+SWEEP = days(date(1700, 1, 1), date(2300, 12, 31)) \
+        + days(date(MIN_YEAR, 1, 1), date(MIN_YEAR + 1, 12, 31)) + days(date(MAX_YEAR - 1, 1, 1), date(MAX_YEAR, 12, 31))
+
+
+@pytest.fixture(scope='module')
+def expected():
+    return np.array([int(str(Week.fromdate(d))) for d in SWEEP])
+
+
+def test_fromdates_matches_week(expected):
+    np.testing.assert_array_equal(fromdates(SWEEP), expected)
+    np.testing.assert_array_equal(fromdates(np.array(SWEEP, dtype='datetime64[D]')), expected)
+    np.testing.assert_array_equal(fromdates([str(d) for d in SWEEP]), expected)
+
+
+def test_fromdates_through_pandas_within_its_range():
+    sweep = pd.date_range('1678-01-01', '2261-12-31', freq='D')
+    expected = [int(str(Week.fromdate(d))) for d in sweep[::97]]
+    np.testing.assert_array_equal(fromdates(sweep)[::97], expected)
+    np.testing.assert_array_equal(fromdates(sweep[::97].strftime('%m/%d/%Y')), expected)
+
+
+def test_week_53_and_year_boundaries(expected):
+    codes = pd.Series(expected, index=SWEEP)
+    assert codes[date(2014, 12, 28)] == 201453 and codes[date(2015, 1, 3)] == 201453
+    assert codes[date(2015, 1, 4)] == 201501
+    assert codes[date(2019, 12, 29)] == 202001 and codes[date(2019, 12, 28)] == 201952
+    assert codes[date(2020, 12, 31)] == 202053
+
+
+def test_startdates_and_nweeks_match_week(expected):
+    codes = np.unique(expected)
+    codes = codes[split(codes)[0] > MIN_YEAR]       # week one of year 1 starts in year 0, which date cannot hold
+    weeks = [Week(int(y), int(w)) for y, w in zip(*split(codes))]
+    np.testing.assert_array_equal(startdates(codes), np.array([w.startdate() for w in weeks], dtype='datetime64[D]'))
+    np.testing.assert_array_equal(enddates(codes), np.array([w.enddate() for w in weeks], dtype='datetime64[D]'))
+    years = np.unique(split(codes)[0])
+    np.testing.assert_array_equal(nweeks(years), [Year(int(y)).totalweeks() for y in years])
+
+
+def test_fromstrings_matches_week(expected):
+    codes = np.unique(expected)
+    strings = [f'{c:06d}' for c in codes]
+    np.testing.assert_array_equal(fromstrings(strings), codes)
+    np.testing.assert_array_equal(fromstrings(codes), [int(str(Week.fromstring(s))) for s in strings])
+    with pytest.raises(ValueError):
+        fromstrings(['201553'])                     # 2015 has 52 weeks
+    with pytest.raises(ValueError):
+        fromstrings(['201400'])
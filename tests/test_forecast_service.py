@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+from sklearn.linear_model import Ridge
+from skforecast.ForecasterAutoreg import ForecasterAutoreg
+from skforecast.ForecasterSarimax import ForecasterSarimax
+from skforecast.Sarimax import Sarimax
+from helper_functions import lag_features
+from forecast_service import ForecastService, calendar_features, serve
+
+VARIABLES = ['TMAX', 'visits']
+EXOG = ['TMAX', 'TMAX_L1', 'visits_L1', 'epiweek_sin', 'epiweek_cos']
+
+
+def weekly_frame(weeks: int = 160) -> pd.DataFrame:
+    """
+    A preprocessed-like frame: target, raw exog, a dummy and the calendar columns.
+    """
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2015-01-04', periods=weeks, freq='W', name='weekstart')
+    calendar = calendar_features(index)
+    return pd.DataFrame({'cases': 50 + 30 * calendar['epiweek_cos'] + rng.poisson(5, weeks),
+                         'TMAX': 50 - 25 * calendar['epiweek_cos'] + rng.normal(0, 3, weeks),
+                         'visits': rng.poisson(200, weeks).astype(float),
+                         'Main Pollutant_CO': rng.random(weeks) < 0.2,
+                         **calendar}, index=index)
+
+
+def fitted_forecasters(df: pd.DataFrame) -> dict:
+    frame = pd.concat([df, lag_features(df, VARIABLES, 3)], axis=1).iloc[3:]
+    ridge = ForecasterAutoreg(Ridge(), lags=3)
+    ridge.fit(frame['cases'], exog=frame[EXOG])
+    sarimax = ForecasterSarimax(Sarimax(order=(1, 0, 0), maxiter=200))
+    sarimax.fit(frame['cases'], exog=frame[['TMAX_L1', 'epiweek_sin', 'epiweek_cos']])
+    return {'Ridge': ridge, 'SARIMAX': sarimax}
+
+
+class Naive:
+    """
+    Repeats the last observed week; fails on request.
+    """
+    window_size = 1
+    fail = False
+
+    def predict(self, steps, last_window):
+        if self.fail:
+            raise RuntimeError('model unavailable')
+        return pd.Series(last_window.iloc[-1], index=pd.date_range(last_window.index[-1], periods=steps + 1, freq='W')[1:])
+
+
+@pytest.fixture(scope='module')
+def data():
+    df = weekly_frame()
+    return df, fitted_forecasters(df.iloc[:120])
+
+
+def test_future_exog_moves_calendar_and_lags_forward(data):
+    df, forecasters = data
+    window = df.iloc[:130].copy()
+    window.loc[window.index[-1], 'cases'] = np.nan          # exog of the next week arrived before its cases
+    service = ForecastService(window, forecasters, variables=VARIABLES, max_steps=3)
+    y, frame, future = service.features(service.df)
+
+    origin = window.index[-2]
+    assert y.index[-1] == origin
+    assert list(future) == list(pd.date_range(origin, periods=4, freq='W')[1:])
+    pd.testing.assert_frame_equal(frame.loc[future, ['epiweek', 'epiweek_sin', 'epiweek_cos']],
+                                  calendar_features(future), check_freq=False)
+    assert frame.loc[future[0], 'TMAX'] == window.loc[future[0], 'TMAX']        # known ahead, kept
+    assert frame.loc[future[1], 'TMAX'] == window.loc[future[0], 'TMAX']        # unknown, carried forward
+    assert frame.loc[future[0], 'TMAX_L1'] == window.loc[origin, 'TMAX']
+    assert frame.loc[future[1], 'TMAX_L1'] == window.loc[future[0], 'TMAX']
+    assert frame.loc[future[2], 'visits_L3'] == window.loc[origin, 'visits']
+    assert frame['Main Pollutant_CO'].dtype == bool
+
+
+def test_update_then_forecast_matches_a_fresh_service(data):
+    df, forecasters = data
+    service = ForecastService(df.iloc[:130], forecasters, variables=VARIABLES)
+    assert service.forecast()['origin'] == str(df.index[129].date())
+
+    service.update(df.iloc[130:132])
+    fresh = ForecastService(df.iloc[:132], forecasters, variables=VARIABLES)
+    assert service.forecast()['origin'] == str(df.index[131].date())
+    assert service.forecast() == fresh.forecast()
+    assert list(service.forecast(1)['forecasts']['SARIMAX']) == [str(df.index[132].date())]
+
+
+def test_update_derives_calendar_and_keeps_missing_columns(data):
+    df, forecasters = data
+    service = ForecastService(df.iloc[:130], forecasters, variables=VARIABLES)
+    service.update(df.iloc[130:132][['cases', 'TMAX', 'visits']])       # no calendar, no dummy
+
+    expected = df.iloc[:132].copy()
+    expected.loc[expected.index[130:], 'Main Pollutant_CO'] = df['Main Pollutant_CO'].iloc[129]
+    fresh = ForecastService(expected, forecasters, variables=VARIABLES)
+    assert service.forecast() == fresh.forecast()
+    _, frame, _ = service.features(service.df)
+    pd.testing.assert_frame_equal(frame[list(df.columns)].loc[:df.index[131]], expected[service.df.index[0]:],
+                                  check_freq=False, check_names=False)
+
+    service.update(pd.DataFrame({'cases': [1.0]}, index=df.index[131:132]))   # revise a week's cases only
+    assert service.df.loc[df.index[131], 'TMAX'] == df.loc[df.index[131], 'TMAX']
+    assert service.df.loc[df.index[131], 'cases'] == 1.0
+
+    with pytest.raises(KeyError, match='TMAXX'):
+        service.update(pd.DataFrame({'TMAXX': [1.0]}, index=df.index[132:133]))
+
+
+def test_failed_update_keeps_previous_state(data):
+    df, _ = data
+    naive = Naive()
+    service = ForecastService(df.iloc[:130], {'Naive': naive}, variables=VARIABLES)
+    before_df, before = service.df, service.forecast()
+
+    naive.fail = True
+    with pytest.raises(RuntimeError):
+        service.update(df.iloc[130:131])
+    assert service.df is before_df
+    assert service.forecast() == before
+
+
+def test_http_update_cycle_and_errors(data):
+    df, _ = data
+    naive = Naive()
+    service = ForecastService(df.iloc[:130], {'Naive': naive}, variables=VARIABLES)
+    server = serve(service, port=0)
+    url = f'http://127.0.0.1:{server.server_address[1]}'
+    try:
+        rows = df.iloc[130:131]
+        body = {str(week.date()): {k: (v.item() if hasattr(v, 'item') else v) for k, v in row.items()}
+                for week, row in rows.iterrows()}
+        res = requests.post(f'{url}/update', json=body)
+        assert res.status_code == 200
+        assert res.json()['origin'] == str(df.index[130].date())
+        assert requests.get(f'{url}/forecast', params={'steps': 1}).json() == service.forecast(1)
+
+        assert requests.post(f'{url}/update', data='not json').status_code == 400
+
+        naive.fail = True
+        before = service.forecast()
+        res = requests.post(f'{url}/update', json={str(df.index[131].date()): body[str(df.index[130].date())]})
+        assert res.status_code == 500
+        assert 'model unavailable' in res.json()['error']
+        assert service.forecast() == before
+    finally:
+        server.shutdown()
+        server.server_close()
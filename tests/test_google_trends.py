@@ -0,0 +1,74 @@
+import json, math, zlib
+import pandas as pd
+import requests
+from datetime import date, timedelta
+from utils.make_google_trends_dataset import url_builder, make_dataset, format_dataset
+
+TERMS = [f'term{i}' for i in range(40)]        # enough terms to split six years into one call per year
+
+
+def value(term: str, day: str) -> float:
+    return zlib.crc32(f'{term}{day}'.encode()) % 10**6 / 100
+
+
+def timelines(endpoint, query, attempt):
+    """
+    Serves one point per Sunday in the requested range for every term.
+    """
+    start = date.fromisoformat(query['time.startDate'][0])
+    end = date.fromisoformat(query['time.endDate'][0])
+    sundays = [start + timedelta(days=d) for d in range((6 - start.weekday()) % 7, (end - start).days + 1, 7)]
+    return 200, {'lines': [{'term': t, 'points': [{'date': str(s), 'value': value(t, str(s))} for s in sundays]}
+                           for t in query['terms']]}
+
+
+def sequential_dataset(iso_start_date, iso_end_date, terms, discovery_url, key):
+    """
+    The loader as it was before requests were made concurrent: one request per
+    block of years, in order, concatenated as they arrive.
+    """
+    data = pd.DataFrame()
+    start_year = date.fromisoformat(iso_start_date).year
+    end_year = date.fromisoformat(iso_end_date).year
+    nyears = (end_year - start_year)
+    ncalls = math.ceil((52 * nyears * len(terms)) / 2000)
+    iter_years = math.ceil(nyears / ncalls)
+    for i in range(start_year, end_year+1, iter_years):
+        url = url_builder(f'{i}-01-01', f'{i + iter_years - 1}-12-31', terms, discovery_url, key=key)
+        contents = json.loads(requests.get(url).content)['lines']
+        for line in contents:
+            df = pd.json_normalize(line['points'], meta=['value', 'date'])
+            df['term'] = line['term']
+            data = pd.concat([data, df])
+    return data
+
+
+def test_concurrent_fetch_matches_sequential_and_respects_limits(stub_api, tmp_path):
+    api = stub_api(timelines, latency=0.2)
+    discovery_url = api.url + 'timelinesForHealth?'
+    df = make_dataset('2015-01-01', '2020-12-31', TERMS, discovery_url, key='secret',
+                      max_workers=3, min_interval=0.05, cache_path=str(tmp_path))
+
+    calls = api.requests
+    assert len(calls) == 6
+    assert max(r['in_flight'] for r in calls) == 3
+    starts = sorted(r['start'] for r in calls)
+    assert min(b - a for a, b in zip(starts, starts[1:])) >= 0.05 - 0.01
+
+    api.requests.clear()
+    expected = sequential_dataset('2015-01-01', '2020-12-31', TERMS, discovery_url, key='secret')
+    pd.testing.assert_frame_equal(format_dataset(df), format_dataset(expected))
+
+
+def test_cached_responses_are_reused_whatever_the_key(stub_api, tmp_path):
+    api = stub_api(timelines)
+    discovery_url = api.url + 'timelinesForHealth?'
+    first = make_dataset('2018-01-01', '2019-12-31', ['flu', 'fever'], discovery_url, key='one',
+                         min_interval=0, cache_path=str(tmp_path))
+    assert len(api.requests) == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+    again = make_dataset('2018-01-01', '2019-12-31', ['flu', 'fever'], discovery_url, key='two',
+                         min_interval=0, cache_path=str(tmp_path))
+    assert len(api.requests) == 1
+    pd.testing.assert_frame_equal(first, again)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+import helper_functions
+from helper_functions import write_cached_frame, read_cached_frame, preprocess_cache_file, compact_frame
+
+
+@pytest.fixture
+def weekly():
+    n = 60
+    return pd.DataFrame({'cases': np.arange(n, dtype=float), 'epiweek': np.arange(n) % 52 + 1,
+                         'Main Pollutant_CO': np.arange(n) % 3 == 0},
+                        index=pd.date_range('2015-01-04', periods=n, freq='W', name='weekstart'))
+
+
+def test_cached_frame_is_writable_unless_memory_mapped(weekly, tmp_path):
+    file = str(tmp_path / 'frame.feather')
+    write_cached_frame(weekly, file)
+
+    df = read_cached_frame(file)
+    pd.testing.assert_frame_equal(df, weekly)
+    df.loc[df.index[0], 'cases'] = 1
+
+    mapped = read_cached_frame(file, mmap=True)
+    pd.testing.assert_frame_equal(mapped, weekly)
+    with pytest.raises(ValueError, match='read-only'):
+        mapped.loc[mapped.index[0], 'cases'] = 1
+
+
+def test_preprocess_cache_file_changes_with_version(tmp_path, monkeypatch):
+    source = tmp_path / 'raw_dataset.csv'
+    source.write_text('epiweek,cases\n201501,1\n')
+    monkeypatch.setattr(helper_functions, 'cache_path', lambda: str(tmp_path))
+    before = preprocess_cache_file(str(source), ('cases',))
+    assert preprocess_cache_file(str(source), ('cases',)) == before
+    monkeypatch.setattr(helper_functions, 'PREPROCESS_VERSION', helper_functions.PREPROCESS_VERSION + 1)
+    assert preprocess_cache_file(str(source), ('cases',)) != before
+
+
+def test_compact_frame_keeps_any_index(weekly, capsys):
+    df = compact_frame(weekly, verbose=False)
+    assert df.index.freq == weekly.index.freq
+    assert df['epiweek'].dtype == np.int8 and df['Main Pollutant_CO'].dtype == bool
+    assert capsys.readouterr().out == ''
+
+    df = compact_frame(weekly.reset_index(drop=True))
+    assert isinstance(df.index, pd.RangeIndex)
+    pd.testing.assert_frame_equal(df, compact_frame(weekly, verbose=False).reset_index(drop=True))
+    assert 'Memory:' in capsys.readouterr().out
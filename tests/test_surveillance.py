@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+import pytest
+from epiweeks import Week
+from utils import surveillance_datasets
+from utils.config import read_config
+from utils.surveillance_datasets import PREAMBLE_LINES, read_incidence_file, read_incidence_files, make_syndromic_dataset
+
+
+def write_export(file, rows: list):
+    file.write_text('\n' * PREAMBLE_LINES + 'Cases by County and Week,,,,\n'
+                    + 'Region,County,52-2019,1-2020,Total\n' + '\n'.join(rows) + '\n')
+
+
+def test_quoted_commas_do_not_shift_fields(tmp_path):
+    file = tmp_path / 'cases.csv'
+    write_export(file, ['"Region 6, West",Kent,5,7,12',
+                        '"Region 6, West","Kent, Ottawa",1,2,3',
+                        'Region 1,"Wayne, Detroit","1,204",,1204'])
+    df = read_incidence_file(str(file), ['Kent', 'Kent, Ottawa'])
+    assert list(df.index) == ['Kent', 'Kent, Ottawa']
+    assert list(df.columns) == ['52-2019', '1-2020']
+    assert df.to_numpy().tolist() == [[5, 7], [1, 2]]
+
+    df = read_incidence_file(str(file))
+    assert list(df.index) == ['Kent', 'Kent, Ottawa', 'Wayne, Detroit']
+    np.testing.assert_array_equal(df.loc['Wayne, Detroit'].to_numpy(), [1204, np.nan])
+
+
+def baseline_syndromic(file, filters: dict = None) -> pd.DataFrame:
+    """
+    The syndromic count as it was before chunking: a Week per visit and a groupby.
+    """
+    df = pd.read_csv(file)
+    for col, values in (filters or {}).items():
+        df = df.loc[df[col].isin(values)]
+    df['visits'], df['Admitted'] = 1, pd.to_datetime(df['Admitted'])
+    df['epiweek'] = df['Admitted'].apply(lambda x: int(str(Week.fromdate(x))))
+    return pd.DataFrame(df.groupby('epiweek')['visits'].sum())
+
+
+@pytest.fixture
+def msss(tmp_path):
+    rng = np.random.default_rng(0)
+    days = pd.Timestamp('2019-12-01') + pd.to_timedelta(rng.integers(0, 120, 500), unit='D')
+    file = tmp_path / 'MSSS.csv'
+    pd.DataFrame({'Admitted': days.strftime('%Y-%m-%d %H:%M'),          # unsorted, so weeks span chunks
+                  'County': rng.choice(['Kent', 'Ottawa', 'Wayne'], 500)}).to_csv(file, index=False)
+    return file
+
+
+@pytest.mark.parametrize('filters', [None, {'County': ['Kent', 'Ottawa']}, {'County': ['Nowhere']}])
+def test_chunked_syndromic_count_matches_baseline(msss, filters):
+    whole = make_syndromic_dataset(str(msss), filters=filters)
+    if filters == {'County': ['Nowhere']}:
+        assert whole.empty and list(whole.columns) == ['visits'] and whole.index.name == 'epiweek'
+    else:
+        pd.testing.assert_frame_equal(whole, baseline_syndromic(msss, filters), check_dtype=False)
+    for chunksize in (1, 3, 7, 1000):
+        pd.testing.assert_frame_equal(make_syndromic_dataset(str(msss), chunksize=chunksize, filters=filters), whole)
+
+
+def test_syndromic_count_of_empty_file(tmp_path):
+    file = tmp_path / 'MSSS.csv'
+    file.write_text('Admitted,County\n')
+    for chunksize in (None, 10):
+        df = make_syndromic_dataset(str(file), chunksize=chunksize)
+        assert df.empty and list(df.columns) == ['visits'] and df.index.name == 'epiweek'
+
+
+def test_module_paths_resolve_from_the_config(tmp_path, monkeypatch):
+    (tmp_path / 'utils').mkdir()
+    (tmp_path / 'utils' / 'secrets.ini').write_text(f'[default]\nroot = {tmp_path}\n')
+    monkeypatch.chdir(tmp_path)
+    read_config.cache_clear()
+    try:
+        assert surveillance_datasets.ROOT_PATH == str(tmp_path)
+        assert surveillance_datasets.DATA_PATH == str(tmp_path / 'src' / 'data')
+        assert surveillance_datasets.FILES == [str(tmp_path / 'src' / 'data' / name) for name in surveillance_datasets.NAMES]
+        with pytest.raises(AttributeError):
+            surveillance_datasets.MISSING
+    finally:
+        read_config.cache_clear()
+
+
+def test_incidence_files_read_on_processes_keep_file_order(tmp_path):
+    files = []
+    for i in range(3):
+        file = tmp_path / f'cases {i}.csv'
+        write_export(file, [f'Region 6,Kent,{i},{i + 1},{2 * i + 1}', f'Region 6,Ottawa,{10 + i},0,{10 + i}'])
+        files.append(str(file))
+    frames = read_incidence_files(files, ['Kent'], max_workers=2)
+    assert [f.loc['Kent'].tolist() for f in frames] == [[0, 1], [1, 2], [2, 3]]
+    for frame, sequential in zip(frames, read_incidence_files(files, ['Kent'], max_workers=1)):
+        pd.testing.assert_frame_equal(frame, sequential)
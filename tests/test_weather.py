@@ -0,0 +1,119 @@
+import zlib
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import date, timedelta
+from utils.make_weather_dataset import (PAGE_SIZE, SETTLED_DAYS, fetch_pages, ncei_session, get_ncei_dataset,
+                                        find_county_stations, county_weather)
+
+GAP = (date(2019, 1, 13), date(2019, 1, 19))       # epiweek 201903, missing from station B
+
+STATIONS = {
+    '26081': [{'id': 'GHCND:A', 'name': 'A', 'latitude': 43.0, 'longitude': -85.5, 'datacoverage': 1.0},
+              {'id': 'GHCND:B', 'name': 'B', 'latitude': 42.9, 'longitude': -85.7, 'datacoverage': 0.95},
+              {'id': 'GHCND:C', 'name': 'C', 'latitude': 42.8, 'longitude': -85.6, 'datacoverage': 0.5}],
+    '26139': [{'id': 'GHCND:D', 'name': 'D', 'latitude': 42.9, 'longitude': -86.0, 'datacoverage': 0.99}],
+}
+
+
+def value(station: str, datatype: str, day: date) -> float:
+    return zlib.crc32(f'{station}{datatype}{day}'.encode()) % 1000 / 10
+
+
+def page(results: list, query: dict) -> dict:
+    """
+    Serves one page of results the way CDO does: 1-based offset, and an empty
+    body for queries without data.
+    """
+    if not results:
+        return {}
+    offset, limit = int(query['offset'][0]), int(query['limit'][0])
+    return {'metadata': {'resultset': {'offset': offset, 'count': len(results), 'limit': limit}},
+            'results': results[offset - 1:offset - 1 + limit]}
+
+
+def cdo(endpoint, query, attempt):
+    """
+    A stand-in for the CDO v2 'data' and 'stations' endpoints.
+    """
+    if endpoint == 'stations':
+        return 200, page(STATIONS.get(query['locationid'][0].split(':')[1], []), query)
+    start, end = date.fromisoformat(query['startdate'][0]), date.fromisoformat(query['enddate'][0])
+    assert start.year == end.year                   # GHCND is served one year per request
+    station = query['stationid'][0]
+    days = [start + timedelta(days=d) for d in range((end - start).days + 1)]
+    results = [{'date': f'{day}T00:00:00', 'datatype': dt, 'station': station, 'attributes': ',,W,',
+                'value': value(station, dt, day)}
+               for day in days if not (station == 'GHCND:B' and GAP[0] <= day <= GAP[1])
+               for dt in query['datatypeid']]
+    return 200, page(results, query)
+
+
+@pytest.mark.parametrize('n', [0, 1, PAGE_SIZE - 1, PAGE_SIZE, PAGE_SIZE + 1, 2 * PAGE_SIZE])
+def test_pagination_stops_once_offset_passes_count(stub_api, n):
+    items = [{'id': i} for i in range(n)]
+    api = stub_api(lambda endpoint, query, attempt: (200, page(items, query)))
+    results = fetch_pages('items', {'q': 1}, ncei_session(token='t'), base_url=api.url)
+    assert results == items
+    assert len(api.requests) == max(1, -(-n // PAGE_SIZE))
+
+
+def test_throttled_requests_are_retried(stub_api, tmp_path):
+    def throttled(endpoint, query, attempt):
+        return (429, {'message': 'slow down'}) if attempt == 0 else cdo(endpoint, query, attempt)
+
+    api = stub_api(throttled)
+    df = get_ncei_dataset(station_id='GHCND:A', datatype_ids=['TMAX'], start_date=date(2018, 12, 30),
+                          end_date=date(2019, 1, 5), min_interval=0, cache_path=str(tmp_path),
+                          base_url=api.url, token='secret')
+    assert len(df) == 7
+    assert len(api.requests) == 4                   # two year chunks, each throttled once
+    assert all(r['headers']['token'] == 'secret' for r in api.requests)
+
+
+def test_recent_chunks_bypass_the_cache(stub_api, tmp_path):
+    api = stub_api(cdo)
+    recent = date.today() - timedelta(days=SETTLED_DAYS // 2)
+    for name, start, end, refetched in [('settled', date(2019, 6, 1), date(2019, 6, 30), False),
+                                        ('recent', recent - timedelta(days=3), recent, True)]:
+        cache = tmp_path / name
+        kwargs = dict(station_id=['GHCND:A', 'GHCND:D'], datatype_ids=['TMAX', 'PRCP'], start_date=start,
+                      end_date=end, min_interval=0, cache_path=str(cache), base_url=api.url, token='t')
+        api.requests.clear()
+        first = get_ncei_dataset(**kwargs)
+        sent = len(api.requests)
+        again = get_ncei_dataset(**kwargs)
+        pd.testing.assert_frame_equal(first, again)
+        assert len(api.requests) == (2 * sent if refetched else sent)
+        assert len(list(cache.glob('*.json')) if cache.exists() else []) == (0 if refetched else sent)
+
+
+def test_county_stations_are_filtered_by_coverage(stub_api, tmp_path):
+    api = stub_api(cdo)
+    df = find_county_stations(['26081', '26139', '26001'], min_coverage=0.9, min_interval=0,
+                              cache_path=str(tmp_path), base_url=api.url, token='t')
+    assert list(df['station']) == ['GHCND:A', 'GHCND:B', 'GHCND:D']
+    assert list(df['county']) == ['26081', '26081', '26139']
+    assert (df['weight'] == 1.0).all()
+
+
+def test_county_weather_renormalises_over_reporting_stations(stub_api, tmp_path):
+    api = stub_api(cdo)
+    df = get_ncei_dataset(station_id=['GHCND:A', 'GHCND:B', 'GHCND:D'], datatype_ids=['TMAX'],
+                          start_date=date(2019, 1, 6), end_date=date(2019, 1, 26), min_interval=0,
+                          cache_path=str(tmp_path), base_url=api.url, token='t')
+    stations = [{'station': 'GHCND:A', 'county': '26081', 'weight': 1.0},
+                {'station': 'GHCND:B', 'county': '26081', 'weight': 3.0},
+                {'station': 'GHCND:D', 'county': '26139', 'weight': 1.0}]
+    weekly = county_weather(df, stations)
+    assert list(weekly.index) == [201902, 201903, 201904]
+    assert list(weekly.columns) == ['26081_TMAX', '26139_TMAX']
+
+    def mean(station, start):
+        return np.mean([value(station, 'TMAX', start + timedelta(days=d)) for d in range(7)])
+
+    for week, start in zip(weekly.index, [date(2019, 1, 6), GAP[0], date(2019, 1, 20)]):
+        a, b = mean('GHCND:A', start), mean('GHCND:B', start)
+        expected = a if start == GAP[0] else (a + 3 * b) / 4
+        assert weekly.loc[week, '26081_TMAX'] == pytest.approx(expected)
+        assert weekly.loc[week, '26139_TMAX'] == pytest.approx(mean('GHCND:D', start))